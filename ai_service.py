@@ -1,39 +1,331 @@
 """
 AI Service for JACAI - Real AI Integration
 """
-import requests
-import openai
-from config import GEMINI_API_KEY, OPENAI_API_KEY
+import asyncio
+import contextlib
+import contextvars
+from config import GEMINI_API_KEY, OPENAI_API_KEY, AI_STRUCTURED_OUTPUT, AI_REQUEST_TIMEOUT
 import json
+import re
 import time
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from generation_cache import generation_cache, cache_key
+from http_client import async_http_client
+from executors import run_io, run_sync
+from singleflight import SingleFlight
+from provider_router import ProviderRouter
+from circuit_breaker import CircuitBreaker
+from rate_limiter import provider_limiter, RateLimitExceeded
+from fair_scheduler import fair_scheduler
+
+STRUCTURED_FIELDS = ("caption", "hashtags", "image_prompt")
+
+# Background callers (batches, jobs, the scheduler) set this so our own provider quota is waited for; otherwise
+# RateLimitExceeded propagates so interactive callers can answer 429. The wait is bounded by the generation timeout
+wait_for_provider_quota = contextvars.ContextVar("wait_for_provider_quota", default=False)
+
+class StructuredOutputError(ValueError):
+    """Raised when a single-call JSON response can't be turned into caption/hashtags/image_prompt"""
+
+def parse_structured_content(text: str) -> Dict:
+    """Extract the caption/hashtags/image_prompt object from a model reply"""
+    if not text:
+        raise StructuredOutputError("Empty response")
+    
+    # Models sometimes wrap JSON in markdown fences or add a sentence around it
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start == -1 or end <= start:
+        raise StructuredOutputError("No JSON object in response")
+    
+    try:
+        data = json.loads(cleaned[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Invalid JSON: {e}")
+    
+    content = {}
+    for field in STRUCTURED_FIELDS:
+        value = data.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        if not isinstance(value, str) or not value.strip():
+            raise StructuredOutputError(f"Missing field: {field}")
+        content[field] = value.strip()
+    return content
 
 class AIService:
+    # (max_tokens, temperature) for OpenAI per-field calls
+    OPENAI_FIELD_PARAMS = {"caption": (300, 0.7), "hashtags": (100, 0.5), "image_prompt": (150, 0.6)}
+    
     def __init__(self):
         self.gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
-        self.openai_client = openai.OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+        self.gemini_stream_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:streamGenerateContent"
+        self.openai_url = "https://api.openai.com/v1/chat/completions"
+        self.openai_model = "gpt-3.5-turbo"
+        self.openai_enabled = bool(OPENAI_API_KEY)
+        self.gemini_enabled = bool(GEMINI_API_KEY)
+        self.structured_output = AI_STRUCTURED_OUTPUT
+        self.request_timeout = AI_REQUEST_TIMEOUT
+        self.cache = generation_cache
+        self.inflight = SingleFlight()
+        self.router = ProviderRouter()
+        self.breakers = {name: CircuitBreaker(name) for name in ("gemini", "openai")}
+    
+    def providers(self) -> List[str]:
+        """Configured providers in default preference order"""
+        configured = [name for name, enabled in (("gemini", self.gemini_enabled), ("openai", self.openai_enabled)) if enabled]
+        return configured or ["gemini"]
+    
+    def ranked_providers(self) -> List[str]:
+        """Router order, with providers whose circuit is open moved to the back"""
+        return sorted(self.router.ranked(self.providers()), key=lambda name: not self.breakers[name].allows_requests())
+    
+    @contextlib.asynccontextmanager
+    async def _guard(self, provider: str):
+        """Rate-limit and circuit-breaker a provider call; yields the adaptive per-call timeout"""
+        while True:
+            if provider_limiter.shared:
+                retry_after = await run_io(provider_limiter.acquire, provider)
+            else:
+                retry_after = provider_limiter.acquire(provider)
+            if not retry_after:
+                break
+            if not wait_for_provider_quota.get():
+                raise RateLimitExceeded(provider, retry_after)
+            await asyncio.sleep(retry_after)
         
-    def generate_content(self, topic: str, platform: str, style: str, use_openai: bool = False) -> Dict:
-        """Generate content using AI"""
-        if use_openai and self.openai_client:
-            return self._generate_with_openai(topic, platform, style)
+        breaker = self.breakers[provider]
+        breaker.acquire()
+        started = time.monotonic()
+        try:
+            yield breaker.timeout()
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (hedging loser, outer timeout) or a closed stream: no verdict on the provider
+            breaker.release()
+            raise
         else:
-            return self._generate_with_gemini(topic, platform, style)
+            breaker.record_success(time.monotonic() - started)
     
-    def _generate_with_gemini(self, topic: str, platform: str, style: str) -> Dict:
-        """Generate content using Gemini"""
+    def _pinned_provider(self, use_openai: Optional[bool]) -> Optional[str]:
+        """use_openai=True/False pins a provider; None lets the router choose"""
+        if use_openai is None:
+            return self.providers()[0] if len(self.providers()) == 1 else None
+        return "openai" if use_openai and self.openai_enabled else "gemini"
+        
+    def generate_content(self, topic: str, platform: str, style: str, use_openai: Optional[bool] = None,
+                         fresh: bool = False) -> Dict:
+        """Generate content using AI; thin sync wrapper over generate_content_async"""
+        return run_sync(self.generate_content_async(topic, platform, style, use_openai=use_openai, fresh=fresh))
+    
+    async def generate_content_async(self, topic: str, platform: str, style: str, use_openai: Optional[bool] = None,
+                                     fresh: bool = False, timeout: float = None) -> Dict:
+        """Generate content using AI; fresh=True bypasses the generation cache, timeout bounds the whole call
+        
+        With use_openai=None and both providers configured, the fastest healthy provider is used and a hedged
+        request goes to the other one if the first runs past its p95 latency.
+        """
+        provider = self._pinned_provider(use_openai)
+        key = cache_key(topic, platform, style, provider or "auto")
+        
+        if not fresh:
+            try:
+                cached = await run_io(self.cache.get, key)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"Generation cache read failed: {e}")
+        
+        async def call_provider() -> Dict:
+            # Queue for a generation slot (fair across users, by priority class); the timeout starts once running
+            async with fair_scheduler.slot():
+                try:
+                    if provider:
+                        generation = self._timed_generate(provider, topic, platform, style)
+                    else:
+                        generation = self._routed_generate(topic, platform, style)
+                    content = await asyncio.wait_for(generation, timeout or self.request_timeout)
+                except asyncio.TimeoutError:
+                    return self._fallback_content(topic, platform, style, f"{provider or 'AI providers'} timed out")
+            
+            try:
+                await run_io(self.cache.set, key, content)
+            except Exception as e:
+                print(f"Generation cache write failed: {e}")
+            return content
+        
+        # Identical concurrent requests (sync or async callers) share a single provider call
+        while True:
+            try:
+                content = await self.inflight.do(key, call_provider)
+                return dict(content)
+            except RateLimitExceeded as e:
+                # A shared call led by an interactive caller gives up on quota; waiting callers try again
+                if not wait_for_provider_quota.get():
+                    raise
+                await asyncio.sleep(e.retry_after)
+    
+    async def _timed_generate(self, provider: str, topic: str, platform: str, style: str) -> Dict:
+        """Run one provider and feed its latency and outcome to the router; our own throttling isn't recorded"""
+        generate = self._generate_with_openai if provider == "openai" else self._generate_with_gemini
+        started = time.monotonic()
         try:
-            # Generate caption
-            caption_prompt = self._build_caption_prompt(topic, platform, style)
-            caption = self._call_gemini(caption_prompt)
+            content = await generate(topic, platform, style)
+        except asyncio.CancelledError:
+            # A hedging loser is censored (neither an error nor a latency sample); a timeout is an error
+            loser = getattr(asyncio.current_task(), "hedge_loser", False)
+            self.router.record(provider, time.monotonic() - started, ok=loser, censored=loser)
+            raise
+        self.router.record(provider, time.monotonic() - started, ok=content.get("ai_provider") != "fallback")
+        return content
+    
+    async def _routed_generate(self, topic: str, platform: str, style: str) -> Dict:
+        """Fastest healthy provider first; hedge to the next after the first's p95, fail over on error"""
+        primary, secondary = self.ranked_providers()[:2]
+        tasks = [asyncio.ensure_future(self._timed_generate(primary, topic, platform, style))]
+        settled = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.router.hedge_delay(primary))
+            if done:
+                try:
+                    content = tasks[0].result()
+                except RateLimitExceeded as throttled:
+                    # Out of quota for the primary, not a provider fault: use the other one if it has quota
+                    try:
+                        return await self._timed_generate(secondary, topic, platform, style)
+                    except RateLimitExceeded as e:
+                        raise RateLimitExceeded("AI providers", min(throttled.retry_after, e.retry_after))
+                if content.get("ai_provider") != "fallback":
+                    settled = True
+                    return content
+                self.router.count("failovers")
+                return await self._timed_generate(secondary, topic, platform, style)
             
-            # Generate hashtags
-            hashtag_prompt = f"Generate 8-10 trending hashtags for {platform} about '{topic}'. Return only hashtags with # symbol, separated by spaces."
-            hashtags = self._call_gemini(hashtag_prompt)
+            self.router.count("hedges")
+            tasks.append(asyncio.ensure_future(self._timed_generate(secondary, topic, platform, style)))
+            pending = set(tasks)
+            content, throttled = None, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except RateLimitExceeded as e:
+                        throttled = e
+                        continue
+                    if content is None or content.get("ai_provider") == "fallback":
+                        content, winner = result, task
+                if content is not None and content.get("ai_provider") != "fallback":
+                    break
+            if content is None:
+                raise throttled
+            if winner is tasks[1]:
+                self.router.count("hedge_wins")
+            settled = True
+            return content
+        finally:
+            # Still running after a winner is a hedging loser; still running after a timeout is a failure
+            for task in tasks:
+                if not task.done():
+                    task.hedge_loser = settled
+                    task.cancel()
+    
+    async def stream_content(self, topic: str, platform: str, style: str, use_openai: Optional[bool] = None,
+                             fresh: bool = False, timeout: float = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """Stream generation as ("delta", {"field", "text"}) events followed by one ("done", content) event
+        
+        Each field is streamed from its own provider call so text reaches the client as tokens arrive.
+        If any stream fails the "done" event carries fallback content, which replaces what was streamed.
+        """
+        provider = self._pinned_provider(use_openai)
+        key = cache_key(topic, platform, style, provider or "auto")
+        # Tokens are already on their way to the client, so a stream can't be hedged; just pick the best provider
+        provider = provider or self.ranked_providers()[0]
+        
+        if not fresh:
+            try:
+                cached = await run_io(self.cache.get, key)
+            except Exception as e:
+                print(f"Generation cache read failed: {e}")
+                cached = None
+            if cached is not None:
+                for field in STRUCTURED_FIELDS:
+                    yield "delta", {"field": field, "text": cached[field]}
+                yield "done", cached
+                return
+        
+        prompts = self._field_prompts(topic, platform, style, provider)
+        queue = asyncio.Queue()
+        
+        async def pump(field: str):
+            try:
+                if provider == "openai":
+                    chunks = self._stream_openai(prompts[field], *self.OPENAI_FIELD_PARAMS[field])
+                else:
+                    chunks = self._stream_gemini(prompts[field])
+                async for text in chunks:
+                    await queue.put((field, text, None))
+                await queue.put((field, None, None))
+            except Exception as e:
+                await queue.put((field, None, e))
+        
+        tasks = [asyncio.ensure_future(pump(field)) for field in STRUCTURED_FIELDS]
+        parts = {field: [] for field in STRUCTURED_FIELDS}
+        deadline = asyncio.get_running_loop().time() + (timeout or self.request_timeout)
+        remaining = len(tasks)
+        try:
+            while remaining:
+                try:
+                    field, text, error = await asyncio.wait_for(queue.get(), deadline - asyncio.get_running_loop().time())
+                except asyncio.TimeoutError:
+                    yield "done", self._fallback_content(topic, platform, style, f"{provider} timed out")
+                    return
+                if isinstance(error, RateLimitExceeded):
+                    raise error
+                if error is not None:
+                    yield "done", self._fallback_content(topic, platform, style, str(error))
+                    return
+                if text is None:
+                    remaining -= 1
+                    continue
+                parts[field].append(text)
+                yield "delta", {"field": field, "text": text}
+        finally:
+            # Also runs when the client disconnects and the generator is closed early
+            for task in tasks:
+                task.cancel()
+        
+        content = {field: "".join(parts[field]).strip() for field in STRUCTURED_FIELDS}
+        content["ai_provider"] = provider
+        try:
+            await run_io(self.cache.set, key, content)
+        except Exception as e:
+            print(f"Generation cache write failed: {e}")
+        yield "done", content
+    
+    async def _generate_with_gemini(self, topic: str, platform: str, style: str) -> Dict:
+        """Generate content using Gemini"""
+        if self.structured_output:
+            try:
+                content = parse_structured_content(await self._call_gemini(self._build_structured_prompt(topic, platform, style)))
+                content["ai_provider"] = "gemini"
+                return content
+            except StructuredOutputError as e:
+                print(f"Gemini structured output unusable ({e}), falling back to per-field calls")
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                return self._fallback_content(topic, platform, style, str(e))
+        
+        try:
+            prompts = self._field_prompts(topic, platform, style, "gemini")
             
-            # Generate image prompt
-            image_prompt = f"Create a detailed image prompt for {style} style visual about '{topic}' for {platform}. Include colors, composition, mood. Max 100 words."
-            image_description = self._call_gemini(image_prompt)
+            # The three fields are independent, so request them together
+            caption, hashtags, image_description = await asyncio.gather(
+                *[self._call_gemini(prompts[field]) for field in STRUCTURED_FIELDS]
+            )
             
             return {
                 "caption": caption,
@@ -41,39 +333,36 @@ class AIService:
                 "image_prompt": image_description,
                 "ai_provider": "gemini"
             }
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return self._fallback_content(topic, platform, style, str(e))
     
-    def _generate_with_openai(self, topic: str, platform: str, style: str) -> Dict:
+    async def _generate_with_openai(self, topic: str, platform: str, style: str) -> Dict:
         """Generate content using OpenAI"""
+        if self.structured_output:
+            try:
+                reply = await self._call_openai(
+                    self._build_structured_prompt(topic, platform, style), max_tokens=600, temperature=0.7,
+                    response_format={"type": "json_object"}
+                )
+                content = parse_structured_content(reply)
+                content["ai_provider"] = "openai"
+                return content
+            except StructuredOutputError as e:
+                print(f"OpenAI structured output unusable ({e}), falling back to per-field calls")
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                return self._fallback_content(topic, platform, style, str(e))
+        
         try:
-            # Generate caption
-            caption_prompt = self._build_caption_prompt(topic, platform, style)
-            caption_response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": caption_prompt}],
-                max_tokens=300,
-                temperature=0.7
-            )
-            caption = caption_response.choices[0].message.content
+            prompts = self._field_prompts(topic, platform, style, "openai")
             
-            # Generate hashtags
-            hashtag_response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": f"Generate 8-10 hashtags for {platform} about '{topic}'"}],
-                max_tokens=100,
-                temperature=0.5
+            # The three fields are independent, so request them together
+            caption, hashtags, image_prompt = await asyncio.gather(
+                *[self._call_openai(prompts[field], *self.OPENAI_FIELD_PARAMS[field]) for field in STRUCTURED_FIELDS]
             )
-            hashtags = hashtag_response.choices[0].message.content
-            
-            # Generate image prompt
-            image_response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": f"Create image prompt for {style} {topic} visual"}],
-                max_tokens=150,
-                temperature=0.6
-            )
-            image_prompt = image_response.choices[0].message.content
             
             return {
                 "caption": caption,
@@ -81,10 +370,12 @@ class AIService:
                 "image_prompt": image_prompt,
                 "ai_provider": "openai"
             }
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return self._fallback_content(topic, platform, style, str(e))
     
-    def _call_gemini(self, prompt: str) -> str:
+    async def _call_gemini(self, prompt: str) -> str:
         """Call Gemini API"""
         try:
             headers = {"Content-Type": "application/json"}
@@ -94,22 +385,113 @@ class AIService:
                 }]
             }
             
-            response = requests.post(
-                f"{self.gemini_url}?key={GEMINI_API_KEY}",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            async with self._guard("gemini") as timeout:
+                response = await async_http_client.post(
+                    f"{self.gemini_url}?key={GEMINI_API_KEY}",
+                    headers=headers,
+                    json=data,
+                    timeout=timeout
+                )
+                
+                if response.status_code != 200:
+                    raise Exception(f"Gemini API error: {response.status_code}")
             
-            if response.status_code == 200:
-                result = response.json()
-                return result["candidates"][0]["content"]["parts"][0]["text"]
-            else:
-                raise Exception(f"Gemini API error: {response.status_code}")
+            result = response.json()
+            return result["candidates"][0]["content"]["parts"][0]["text"]
                 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Gemini API call failed: {str(e)}")
     
+    async def _stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        """Stream Gemini text chunks via streamGenerateContent (server-sent events)"""
+        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        
+        async with self._guard("gemini") as timeout, async_http_client.stream(
+            "POST", f"{self.gemini_stream_url}?alt=sse&key={GEMINI_API_KEY}", json=data, timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"Gemini API error: {response.status_code}")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[5:])
+                for candidate in chunk.get("candidates", [])[:1]:
+                    for part in candidate.get("content", {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+    
+    async def _call_openai(self, prompt: str, max_tokens: int, temperature: float, response_format: Dict = None) -> str:
+        """Call OpenAI chat completions API"""
+        try:
+            data = {
+                "model": self.openai_model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            if response_format:
+                data["response_format"] = response_format
+            
+            async with self._guard("openai") as timeout:
+                response = await async_http_client.post(
+                    self.openai_url,
+                    headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+                    json=data,
+                    timeout=timeout
+                )
+                
+                if response.status_code != 200:
+                    raise Exception(f"OpenAI API error: {response.status_code}")
+            
+            return response.json()["choices"][0]["message"]["content"]
+                
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise Exception(f"OpenAI API call failed: {str(e)}")
+    
+    async def _stream_openai(self, prompt: str, max_tokens: int, temperature: float) -> AsyncIterator[str]:
+        """Stream OpenAI chat completion deltas (stream=True)"""
+        data = {
+            "model": self.openai_model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+        
+        async with self._guard("openai") as timeout, async_http_client.stream(
+            "POST", self.openai_url, headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}, json=data, timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"OpenAI API error: {response.status_code}")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                for choice in json.loads(payload).get("choices", [])[:1]:
+                    text = choice.get("delta", {}).get("content")
+                    if text:
+                        yield text
+    
+    def _field_prompts(self, topic: str, platform: str, style: str, provider: str) -> Dict[str, str]:
+        """Per-field prompts used when fields are requested (or streamed) separately"""
+        if provider == "openai":
+            return {
+                "caption": self._build_caption_prompt(topic, platform, style),
+                "hashtags": f"Generate 8-10 hashtags for {platform} about '{topic}'",
+                "image_prompt": f"Create image prompt for {style} {topic} visual"
+            }
+        return {
+            "caption": self._build_caption_prompt(topic, platform, style),
+            "hashtags": f"Generate 8-10 trending hashtags for {platform} about '{topic}'. Return only hashtags with # symbol, separated by spaces.",
+            "image_prompt": f"Create a detailed image prompt for {style} style visual about '{topic}' for {platform}. Include colors, composition, mood. Max 100 words."
+        }
+    
     def _build_caption_prompt(self, topic: str, platform: str, style: str) -> str:
         """Build platform-specific caption prompt"""
         platform_specs = {
@@ -141,6 +523,20 @@ Requirements:
 
 Generate only the caption text, no additional formatting or labels."""
     
+    def _build_structured_prompt(self, topic: str, platform: str, style: str) -> str:
+        """Ask for caption, hashtags and image prompt in one JSON reply"""
+        caption_prompt = self._build_caption_prompt(topic, platform, style).replace(
+            "Generate only the caption text, no additional formatting or labels.", ""
+        ).rstrip()
+        
+        return f"""{caption_prompt}
+
+Also generate 8-10 trending hashtags for {platform} about "{topic}", and a detailed image prompt
+(max 100 words, including colors, composition and mood) for a {style} style visual about "{topic}".
+
+Respond with only a JSON object, no markdown, using exactly these keys:
+{{"caption": "<caption text>", "hashtags": "<hashtags with # separated by spaces>", "image_prompt": "<image prompt>"}}"""
+    
     def _fallback_content(self, topic: str, platform: str, style: str, error: str) -> Dict:
         """Fallback content when AI fails"""
         print(f"AI generation failed: {error}. Using fallback content.")
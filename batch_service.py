@@ -0,0 +1,173 @@
+"""
+Batch Generation for JACAI - Bounded Worker Pool with Bulk Persistence and Progress Tracking
+"""
+import asyncio
+import secrets
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from database import db
+from executors import run_io
+from ai_service import wait_for_provider_quota
+from fair_scheduler import generation_context, BACKGROUND
+from config import BATCH_CONCURRENCY, BATCH_PERSIST_EVERY, BATCH_RETENTION_SECONDS
+
+def _persist_batch_rows(rows: List[tuple]) -> List[int]:
+    """Insert (user_id, topic, platform, style, caption, hashtags, image_prompt) drafts in one transaction"""
+    return db.insert_many(
+        "INSERT INTO generated_posts (user_id, topic, platform, style, caption, hashtags, image_prompt, post_status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')",
+        rows
+    )
+
+class BatchJob:
+    def __init__(self, user_id: int, items: List[dict], fresh: bool, weight: float = 1.0):
+        self.id = secrets.token_urlsafe(12)
+        self.user_id = user_id
+        self.weight = weight
+        self.items = items
+        self.fresh = fresh
+        self.status = "queued"
+        self.total = sum(len(item["platforms"]) for item in items)
+        self.completed = 0
+        self.failed = 0
+        self.saved = 0
+        self.results: List[dict] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+    
+    def progress(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "batch_id": self.id,
+            "status": self.status,
+            "items": len(self.items),
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "saved": self.saved,
+            "percent": round(100 * done / self.total, 1) if self.total else 100.0,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+class BatchRunner:
+    def __init__(self, concurrency: int = BATCH_CONCURRENCY, persist_every: int = BATCH_PERSIST_EVERY,
+                 retention: float = BATCH_RETENTION_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.persist_every = max(1, persist_every)
+        self.retention = retention
+        self._jobs: Dict[str, BatchJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        # Shared by every batch so concurrent batches don't multiply provider load
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    def submit(self, user_id: int, items: List[dict], fresh: bool,
+               generate: Callable[[str, str, str, bool], Awaitable[dict]], weight: float = 1.0) -> BatchJob:
+        """Register a batch and start it on the running event loop; returns immediately"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        self._prune()
+        
+        job = BatchJob(user_id, items, fresh, weight)
+        with self._lock:
+            self._jobs[job.id] = job
+        task = asyncio.ensure_future(self._run(job, generate))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+    
+    def get(self, batch_id: str, user_id: int) -> Optional[BatchJob]:
+        with self._lock:
+            job = self._jobs.get(batch_id)
+        return job if job is not None and job.user_id == user_id else None
+    
+    async def _run(self, job: BatchJob, generate):
+        job.status = "running"
+        units = asyncio.Queue()
+        for index, item in enumerate(job.items):
+            for platform in item["platforms"]:
+                units.put_nowait((index, item, platform))
+        
+        pending: List[tuple] = []  # (result, row) awaiting bulk insert
+        flush_lock = asyncio.Lock()
+        
+        async def flush():
+            async with flush_lock:
+                if not pending:
+                    return
+                batch = pending[:]
+                del pending[:]
+                post_ids = await run_io(_persist_batch_rows, [row for _, row in batch])
+                for (result, _), post_id in zip(batch, post_ids):
+                    result["post_id"] = post_id
+                    job.results.append(result)
+                job.saved += len(batch)
+        
+        async def worker():
+            wait_for_provider_quota.set(True)
+            generation_context.set((f"user:{job.user_id}", BACKGROUND, job.weight))
+            while True:
+                try:
+                    index, item, platform = units.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = {"index": index, "topic": item["topic"], "platform": platform, "style": item["style"]}
+                try:
+                    async with self._slots:
+                        content = await generate(item["topic"], platform, item["style"], job.fresh)
+                    if content.get("ai_provider") == "fallback":
+                        raise Exception(content.get("error", "AI generation failed"))
+                except Exception as e:
+                    result["error"] = str(e)
+                    job.results.append(result)
+                    job.failed += 1
+                    continue
+                
+                result["content"] = content
+                job.completed += 1
+                pending.append((result, (
+                    job.user_id, item["topic"], platform, item["style"],
+                    content["caption"], content["hashtags"], content["image_prompt"]
+                )))
+                if len(pending) >= self.persist_every:
+                    await flush()
+        
+        try:
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, job.total) or 1)])
+            await flush()
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+    
+    def _prune(self):
+        """Forget finished batches after the retention period; their posts stay in generated_posts"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for batch_id in [i for i, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+                del self._jobs[batch_id]
+    
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "concurrency": self.concurrency,
+            "running": sum(1 for job in jobs if job.status == "running"),
+            "tracked": len(jobs)
+        }
+
+# Global batch runner instance
+batch_runner = BatchRunner()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check that concurrent /api/generate calls overlap instead of queueing on the event loop
+
+Usage: python benchmarks/concurrent_generate.py [--requests 50]
+Exits non-zero when N concurrent calls take much longer than a single one. The regression itself is guarded in
+CI by tests/test_concurrent_generate.py; this script is for measuring against the real (or mock) generator.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+async def run(concurrency: int, tolerance: float) -> int:
+    import httpx
+    from enhanced_app import app, init_db
+    
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        credentials = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+        await client.post("/api/register", json=credentials)
+        login = await client.post("/api/login", json={"username": "bench", "password": "bench-password"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        payload = {"topic": "latency", "platforms": ["instagram"], "style": "casual"}
+        
+        started = time.perf_counter()
+        single = await client.post("/api/generate", json=payload, headers=headers)
+        single_seconds = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/generate", json=payload, headers=headers) for _ in range(concurrency)
+        ])
+        concurrent_seconds = time.perf_counter() - started
+    
+    failures = [r for r in [single, *responses] if r.status_code != 200 or not r.json().get("success")]
+    print(f"1 request:   {single_seconds:.2f}s")
+    print(f"{concurrency} requests: {concurrent_seconds:.2f}s ({concurrent_seconds / single_seconds:.1f}x)")
+    
+    if failures:
+        print(f"❌ {len(failures)} request(s) failed")
+        return 1
+    if concurrent_seconds > single_seconds * tolerance:
+        print(f"❌ Concurrent requests serialized (limit {tolerance:.1f}x)")
+        return 1
+    print("✅ Concurrent requests overlapped")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=2.5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # Every request comes from one user; the per-user API limit would turn most of them into 429s
+        os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+        os.environ["RATE_LIMIT_PER_HOUR"] = "0"
+        os.chdir(ROOT)
+        sys.exit(asyncio.run(run(args.requests, args.tolerance)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot JACAI queries before and after the index migration
+
+Usage: python benchmarks/db_queries.py [--posts 1000000] [--users 5000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import run_migrations
+
+PLATFORMS = ["instagram", "twitter", "linkedin", "facebook", "tiktok"]
+
+def seed(conn: sqlite3.Connection, posts: int, users: int):
+    """Fill the baseline schema with synthetic users, posts and schedules"""
+    now = datetime(2024, 1, 1)
+    conn.executemany(
+        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        ((f"user{i}", f"user{i}@example.com", "x") for i in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO social_accounts (user_id, platform, account_name, access_token) VALUES (?, ?, ?, ?)",
+        ((u, p, f"acct{u}", "token") for u in range(1, users + 1) for p in PLATFORMS[:3])
+    )
+    
+    batch = 50000
+    for start in range(0, posts, batch):
+        rows = []
+        for i in range(start, min(start + batch, posts)):
+            created = now + timedelta(seconds=i)
+            rows.append((
+                random.randint(1, users), "topic", random.choice(PLATFORMS), "professional",
+                "caption " * 20, "#tag", "prompt", created.strftime("%Y-%m-%d %H:%M:%S")
+            ))
+        conn.executemany(
+            "INSERT INTO generated_posts (user_id, topic, platform, style, caption, hashtags, image_prompt, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    
+    scheduled = max(1, posts // 10)
+    conn.executemany(
+        "INSERT INTO scheduled_posts (user_id, topic, platforms, style, scheduled_time, status) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (random.randint(1, users), "topic", '["instagram"]', "casual",
+             now + timedelta(minutes=i), "pending" if i % 20 == 0 else "completed")
+            for i in range(scheduled)
+        )
+    )
+    conn.commit()
+
+def time_query(conn: sqlite3.Connection, sql: str, params_fn, repeat: int) -> float:
+    """Average milliseconds per execution"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params_fn()).fetchall()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+def run_suite(conn: sqlite3.Connection, users: int, repeat: int) -> dict:
+    cutoff = datetime(2024, 1, 2)
+    return {
+        "/api/posts (user_id, created_at)": time_query(
+            conn,
+            "SELECT topic, platform, style, caption, hashtags, created_at, post_status FROM generated_posts "
+            "WHERE user_id = ? ORDER BY created_at DESC LIMIT 50",
+            lambda: (random.randint(1, users),), repeat
+        ),
+        "get_pending_posts (status, time)": time_query(
+            conn,
+            "SELECT id, user_id, topic, platforms, style, scheduled_time, content_json FROM scheduled_posts "
+            "WHERE status = 'pending' AND scheduled_time <= ?",
+            lambda: (cutoff,), repeat
+        ),
+        "get_current_user (username)": time_query(
+            conn,
+            "SELECT * FROM users WHERE username = ? AND is_active = TRUE",
+            lambda: (f"user{random.randint(0, users - 1)}",), repeat
+        ),
+        "social account (user_id, platform)": time_query(
+            conn,
+            "SELECT access_token FROM social_accounts WHERE user_id = ? AND platform = ? AND is_active = TRUE",
+            lambda: (random.randint(1, users), random.choice(PLATFORMS)), repeat
+        ),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.execute("PRAGMA journal_mode = WAL")
+        run_migrations(conn, target=1)
+        
+        print(f"Seeding {args.posts:,} generated posts for {args.users:,} users...")
+        seed(conn, args.posts, args.users)
+        
+        before = run_suite(conn, args.users, args.repeat)
+        started = time.perf_counter()
+        run_migrations(conn)
+        migrate_seconds = time.perf_counter() - started
+        after = run_suite(conn, args.users, args.repeat)
+        conn.close()
+    
+    print(f"\nIndex migration took {migrate_seconds:.1f}s\n")
+    print(f"{'query':40} {'before ms':>12} {'after ms':>12} {'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:40} {before[name]:12.3f} {after[name]:12.3f} {speedup:9.1f}x")
+
+if __name__ == "__main__":
+    main()
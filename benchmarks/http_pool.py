@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-call requests.post against the shared keep-alive pool using a local stub server
+
+Usage: python benchmarks/http_pool.py [--requests 500] [--tls]
+--tls serves HTTPS with a throwaway self-signed certificate (needs the openssl CLI),
+which is where the saved handshake time matters most.
+"""
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from http_client import HTTPClient
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid delayed-ACK stalls
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+def self_signed_cert(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+def start_stub(tls_dir: str = None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    scheme = "http"
+    if tls_dir:
+        cert, key = self_signed_cert(tls_dir)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/generate"
+
+def timed(label: str, send, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        send().raise_for_status()
+    elapsed = time.perf_counter() - started
+    print(f"{label:28} {elapsed * 1000 / count:8.3f} ms/request")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        server, url = start_stub(tmp if args.tls else None)
+        payload = {"contents": [{"parts": [{"text": "hello"}]}]}
+        
+        print(f"{args.requests} POSTs to {url}")
+        fresh = timed("requests.post (new conn)", lambda: requests.post(url, json=payload, timeout=10, verify=False), args.requests)
+        client = HTTPClient()
+        pooled = timed("http_client (keep-alive)", lambda: client.post(url, json=payload, verify=False), args.requests)
+        
+        stats = client.stats()
+        print(f"\nPool opened {stats['connections_opened']} connection(s) for {stats['requests']} requests")
+        print(f"Saved {(fresh - pooled) * 1000 / args.requests:.3f} ms/request ({fresh / pooled:.1f}x faster)")
+        
+        client.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
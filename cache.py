@@ -0,0 +1,84 @@
+"""
+In-Process Caches for JACAI - Thread-Safe LRU with TTL
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size_bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it most recently used"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value, size)
+            self.size_bytes += size
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+    
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key)
+        self.size_bytes -= entry[2]
+    
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop a single entry; returns True if it was cached"""
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            return True
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size_bytes": self.size_bytes,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,112 @@
+"""
+Circuit Breaker for JACAI - Fail Fast on Degraded AI Providers with Latency-Derived Timeouts
+"""
+import threading
+import time
+from collections import deque
+from provider_router import percentile
+from config import (
+    AI_BREAKER_FAILURE_THRESHOLD, AI_BREAKER_RECOVERY_SECONDS, AI_TIMEOUT_PERCENTILE, AI_TIMEOUT_MULTIPLIER,
+    AI_TIMEOUT_MIN, HTTP_READ_TIMEOUT, AI_ROUTING_WINDOW, AI_ROUTING_MIN_SAMPLES
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = AI_BREAKER_FAILURE_THRESHOLD,
+                 recovery_seconds: float = AI_BREAKER_RECOVERY_SECONDS, half_open_calls: int = 1,
+                 window: int = AI_ROUTING_WINDOW, min_samples: int = AI_ROUTING_MIN_SAMPLES,
+                 timeout_percentile: float = AI_TIMEOUT_PERCENTILE, timeout_multiplier: float = AI_TIMEOUT_MULTIPLIER,
+                 min_timeout: float = AI_TIMEOUT_MIN, max_timeout: float = HTTP_READ_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_calls = half_open_calls
+        self.min_samples = min_samples
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self.rejected = 0
+        self.trips = 0
+    
+    def _current_state(self) -> str:
+        # Caller holds the lock; an open breaker turns half-open once the recovery period has passed
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = HALF_OPEN
+            self._trials = 0
+        return self._state
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+    
+    def allows_requests(self) -> bool:
+        """Whether a call would be let through right now (without reserving a trial slot)"""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._trials < self.half_open_calls)
+    
+    def acquire(self):
+        """Reserve a call; raises CircuitOpenError when open or when half-open trials are in use"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+    
+    def release(self):
+        """Give back a reservation whose call was abandoned (cancelled) without an outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials:
+                self._trials -= 1
+    
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self._failures = 0
+            self._state = CLOSED
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+    
+    def timeout(self) -> float:
+        """Per-call timeout: a multiple of the observed latency percentile, within [min_timeout, max_timeout]"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return self.max_timeout
+            observed = percentile(list(self.latencies), self.timeout_percentile) * self.timeout_multiplier
+        return max(self.min_timeout, min(self.max_timeout, observed))
+    
+    def stats(self) -> dict:
+        timeout = self.timeout()
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "timeout_seconds": round(timeout, 3)
+            }
@@ -12,18 +12,78 @@ LINKEDIN_ACCESS_TOKEN = os.getenv("LINKEDIN_ACCESS_TOKEN", "")
 
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///jacai.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough under WAL
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Concurrency
+IO_THREAD_POOL_SIZE = int(os.getenv("IO_THREAD_POOL_SIZE", "64"))
+
+# Outbound HTTP
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+
+# Caching
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+METRICS_CACHE_SECONDS = float(os.getenv("METRICS_CACHE_SECONDS", "15"))  # table aggregates in /api/metrics are refreshed at most this often
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() == "true"
+GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+GENERATION_CACHE_MEMORY_ITEMS = int(os.getenv("GENERATION_CACHE_MEMORY_ITEMS", "2000"))
+
+# Pagination
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
 
 # Security
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # existing hashes are upgraded on next login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str((os.cpu_count() or 2) * 8)))
 
 # Rate Limiting
-RATE_LIMIT_PER_MINUTE = 10
-RATE_LIMIT_PER_HOUR = 100
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "10"))  # per user (or client IP) and route; 0 disables
+RATE_LIMIT_PER_HOUR = int(os.getenv("RATE_LIMIT_PER_HOUR", "100"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "sqlite" shares buckets across worker processes
+AI_PROVIDER_RATE_PER_MINUTE = int(os.getenv("AI_PROVIDER_RATE_PER_MINUTE", "60"))  # upstream calls per provider; 0 disables
 
 # Content Generation
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "60"))  # upper bound for one post's generation
+AI_STRUCTURED_OUTPUT = os.getenv("AI_STRUCTURED_OUTPUT", "true").lower() == "true"  # one JSON call per post
 MAX_CONTENT_LENGTH = 2000
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "5"))  # parallel platforms per request
+GENERATION_SLOTS = int(os.getenv("GENERATION_SLOTS", "16"))  # provider generations in flight per process, shared fairly by users
+# Fair-share weight per user role, e.g. "admin=2,pro=3": a weight-2 user gets twice the slots of a weight-1 user under contention
+FAIR_SHARE_WEIGHTS = {
+    role.strip(): float(weight)
+    for role, _, weight in (item.partition("=") for item in os.getenv("FAIR_SHARE_WEIGHTS", "").split(","))
+    if role.strip()
+}
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # generations in flight across all batches
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))  # (topic, platforms, style) items per batch request
+BATCH_PERSIST_EVERY = int(os.getenv("BATCH_PERSIST_EVERY", "50"))  # results per bulk insert
+BATCH_RETENTION_SECONDS = float(os.getenv("BATCH_RETENTION_SECONDS", "3600"))  # finished batch progress kept in memory
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # async-mode /api/generate jobs run concurrently per process
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "180"))  # a running job whose worker died is retried after this
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))  # idle workers re-check the table for jobs queued by other processes
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))  # long-poll cap for GET /api/jobs/{id}?wait=
+AI_ROUTING_WINDOW = int(os.getenv("AI_ROUTING_WINDOW", "100"))  # recent calls kept per provider for latency/error stats
+AI_ROUTING_MIN_SAMPLES = int(os.getenv("AI_ROUTING_MIN_SAMPLES", "10"))  # calls before a provider's stats are trusted
+AI_ROUTING_ERROR_THRESHOLD = float(os.getenv("AI_ROUTING_ERROR_THRESHOLD", "0.5"))  # error rate that marks a provider unhealthy
+AI_HEDGING_ENABLED = os.getenv("AI_HEDGING_ENABLED", "true").lower() == "true"  # second provider after the first's p95
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive failures that open a provider's circuit
+AI_BREAKER_RECOVERY_SECONDS = float(os.getenv("AI_BREAKER_RECOVERY_SECONDS", "30"))  # open time before a half-open trial call
+AI_TIMEOUT_PERCENTILE = float(os.getenv("AI_TIMEOUT_PERCENTILE", "99"))  # per-call timeout follows this latency percentile...
+AI_TIMEOUT_MULTIPLIER = float(os.getenv("AI_TIMEOUT_MULTIPLIER", "2"))  # ...times this, capped at HTTP_READ_TIMEOUT
+AI_TIMEOUT_MIN = float(os.getenv("AI_TIMEOUT_MIN", "5"))  # floor for the adaptive per-call timeout
 SUPPORTED_PLATFORMS = ["instagram", "twitter", "linkedin", "facebook", "tiktok"]
 SUPPORTED_STYLES = ["professional", "casual", "creative", "motivational", "humorous"]
 
@@ -33,4 +93,23 @@ MAX_IMAGE_SIZE = "1024x1024"
 
 # Scheduling
 TIMEZONE = "UTC"
-MAX_SCHEDULED_POSTS = 50
\ No newline at end of file
+MAX_SCHEDULED_POSTS = 50  # posts one automation rule may materialize per expansion horizon
+AUTOMATION_MIN_INTERVAL_SECONDS = float(os.getenv("AUTOMATION_MIN_INTERVAL_SECONDS", "3600"))  # rules may not fire more often than this
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"  # run the dispatcher inside the web app
+SCHEDULER_RESYNC_SECONDS = float(os.getenv("SCHEDULER_RESYNC_SECONDS", "300"))  # reload from the table (posts scheduled by other processes)
+SCHEDULER_HEAP_LIMIT = int(os.getenv("SCHEDULER_HEAP_LIMIT", "1000"))  # upcoming times held in memory; refilled when drained
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "16"))  # due posts generated/published concurrently
+SCHEDULER_PLATFORM_CONCURRENCY = int(os.getenv("SCHEDULER_PLATFORM_CONCURRENCY", "8"))  # in-flight publishes per platform
+SCHEDULER_ACCOUNT_CONCURRENCY = int(os.getenv("SCHEDULER_ACCOUNT_CONCURRENCY", "1"))  # in-flight publishes per linked account
+SCHEDULER_WORKER_ID = os.getenv("SCHEDULER_WORKER_ID", "")  # defaults to host:pid; recorded on claimed posts
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))  # a claimed post whose worker died is retried after this
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3"))
+SCHEDULER_SHUTDOWN_TIMEOUT = float(os.getenv("SCHEDULER_SHUTDOWN_TIMEOUT", "30"))  # wait this long for in-flight posts on shutdown
+SCHEDULER_CLAIM_BATCH = int(os.getenv("SCHEDULER_CLAIM_BATCH", "100"))  # most posts one worker holds (claimed, unfinished) at once
+SCHEDULER_PREGENERATE_HORIZON_SECONDS = float(os.getenv("SCHEDULER_PREGENERATE_HORIZON_SECONDS", "1800"))  # generate content this far ahead; 0 disables
+SCHEDULER_PREGENERATE_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_PREGENERATE_INTERVAL_SECONDS", "60"))
+SCHEDULER_PREGENERATE_CONCURRENCY = int(os.getenv("SCHEDULER_PREGENERATE_CONCURRENCY", "4"))  # posts generated at once per pass
+SCHEDULER_PREGENERATE_BATCH = int(os.getenv("SCHEDULER_PREGENERATE_BATCH", "200"))  # posts picked up per pass
+SCHEDULER_EXPANSION_HORIZON_SECONDS = float(os.getenv("SCHEDULER_EXPANSION_HORIZON_SECONDS", "172800"))  # automation rules are materialized this far ahead
+SCHEDULER_EXPANSION_INTERVAL_SECONDS = float(os.getenv("SCHEDULER_EXPANSION_INTERVAL_SECONDS", "3600"))  # 0 disables expansion in the dispatcher
+SCHEDULER_EXPANSION_BATCH = int(os.getenv("SCHEDULER_EXPANSION_BATCH", "500"))  # rules expanded per transaction
\ No newline at end of file
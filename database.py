@@ -0,0 +1,143 @@
+"""
+Database Access Layer for JACAI - Pooled SQLite Connections
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from typing import List
+from config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT_MS,
+    DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+)
+from migrations import run_migrations
+
+class DatabasePoolExhausted(Exception):
+    """Raised when no pooled connection becomes free within the pool timeout"""
+
+def database_path(url: str) -> str:
+    """Resolve a sqlite:/// URL (or plain path) to a filesystem path"""
+    if url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):] or ":memory:"
+    if url.startswith("sqlite://"):
+        return url[len("sqlite://"):] or ":memory:"
+    return url
+
+class Database:
+    def __init__(self, path: str = None, pool_size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT):
+        self.path = path or database_path(DATABASE_URL)
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self._pool = LifoQueue(maxsize=self.pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with JACAI's tuned pragmas applied"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        
+        try:
+            return self._pool.get(timeout=self.timeout)
+        except Empty:
+            raise DatabasePoolExhausted(
+                f"No database connection available after {self.timeout}s (pool size {self.pool_size})"
+            )
+    
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put_nowait(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; uncommitted work is rolled back on return"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """Borrow a pooled connection and commit once the block succeeds"""
+        with self.connection() as conn:
+            yield conn
+            conn.commit()
+    
+    @contextmanager
+    def immediate(self):
+        """Like transaction(), but BEGIN IMMEDIATE takes the write lock up front
+        
+        Use it for read-then-write work (claims, token buckets) where two workers must not both act on what they read.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.commit()
+    
+    def insert_many(self, sql: str, rows: List[tuple]) -> List[int]:
+        """Run one INSERT per row in a single transaction and return the new rows' ids in order"""
+        if not rows:
+            return []
+        with self.transaction() as conn:
+            conn.executemany(sql, rows)
+            # The write lock is held until commit, so AUTOINCREMENT ids for this batch are consecutive
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    
+    def migrate(self) -> int:
+        """Bring the schema up to date; safe to call from every module on startup"""
+        with self.connection() as conn:
+            return run_migrations(conn)
+    
+    def stats(self) -> dict:
+        """Pool usage for monitoring"""
+        return {
+            "pool_size": self.pool_size,
+            "open_connections": self._created,
+            "idle_connections": self._pool.qsize()
+        }
+    
+    def close(self):
+        """Close every idle pooled connection"""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._pool.get_nowait()
+                except Empty:
+                    break
+                conn.close()
+                self._created -= 1
+
+# Global database instance
+db = Database()
@@ -6,19 +6,36 @@ With authentication, multi-platform posting, and n8n integration
 
 from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 import jwt
-import bcrypt
-import sqlite3
 import requests
 from datetime import datetime, timedelta
 from typing import Optional, List
 import os
+import asyncio
+import json
+import math
+from database import db
+from executors import run_io, shutdown_executors
+from password_service import password_hasher, HashingOverloaded
+from cache import TTLCache
+from config import (
+    USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS, GENERATION_CONCURRENCY, GEMINI_API_KEY, OPENAI_API_KEY, BATCH_MAX_ITEMS,
+    JOB_MAX_WAIT_SECONDS, SCHEDULER_ENABLED, METRICS_CACHE_SECONDS
+)
+from ai_service import ai_service, wait_for_provider_quota
+from http_client import http_client, async_http_client
+from pagination import clamp_limit, keyset_page, select_fields
+from rate_limiter import request_limiter, provider_limiter, RateLimitExceeded
+from batch_service import batch_runner
+from job_service import job_queue
+from fair_scheduler import fair_scheduler, generation_as, role_weight, user_weight, INTERACTIVE, BACKGROUND
+from scheduler import dispatcher
 
 # Configuration
 SECRET_KEY = "your-secret-key-change-this"
@@ -45,57 +62,7 @@ templates = Jinja2Templates(directory="web")
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active BOOLEAN DEFAULT TRUE
-        )
-    ''')
-    
-    # Social accounts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS social_accounts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            platform TEXT NOT NULL,
-            account_name TEXT,
-            access_token TEXT,
-            refresh_token TEXT,
-            expires_at TIMESTAMP,
-            is_active BOOLEAN DEFAULT TRUE,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Generated posts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS generated_posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            topic TEXT NOT NULL,
-            platform TEXT NOT NULL,
-            style TEXT NOT NULL,
-            caption TEXT,
-            hashtags TEXT,
-            image_prompt TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            posted_at TIMESTAMP,
-            post_status TEXT DEFAULT 'draft',
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    db.migrate()
 
 # Models
 class UserCreate(BaseModel):
@@ -112,6 +79,17 @@ class GenerateRequest(BaseModel):
     platforms: List[str] = ["instagram"]
     style: str = "professional"
     auto_post: bool = False
+    fresh: bool = False  # bypass the generation cache
+    async_job: bool = False  # return 202 with a job id instead of waiting for the result
+
+class BatchItem(BaseModel):
+    topic: str
+    platforms: List[str] = ["instagram"]
+    style: str = "professional"
+
+class BatchGenerateRequest(BaseModel):
+    items: List[BatchItem]
+    fresh: bool = False
 
 class SocialAccountLink(BaseModel):
     platform: str
@@ -136,25 +114,80 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def get_current_user(username: str = Depends(verify_token)):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ? AND is_active = TRUE", (username,))
-    user = cursor.fetchone()
-    conn.close()
+def _load_active_user(username: str):
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE username = ? AND is_active = TRUE", (username,))
+        return cursor.fetchone()
+
+# Resolved users keyed by username; only active users are cached
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+# Full-table aggregates for /api/metrics; in-memory counters are always read live
+metrics_cache = TTLCache(maxsize=1, ttl=METRICS_CACHE_SECONDS)
+
+def invalidate_user_cache(username: str):
+    """Call after deactivating a user, changing their role or re-registering the username"""
+    user_cache.invalidate(username)
+
+async def get_current_user(username: str = Depends(verify_token)):
+    cached = user_cache.get(username)
+    if cached is not None:
+        return dict(cached)
+    
+    user = await run_io(_load_active_user, username)
     
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
-    return {
+    current_user = {
         "id": user[0],
         "username": user[1],
         "email": user[2],
         "role": user[4]
     }
+    user_cache.set(username, current_user)
+    return dict(current_user)
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Rate limit exceeded",
+        headers={"Retry-After": str(math.ceil(retry_after))}
+    )
 
-# AI Generation (Mock for demo)
-def generate_content(topic: str, platform: str, style: str) -> dict:
+async def enforce_rate_limit(key: str):
+    """429 with Retry-After once the per-minute or per-hour bucket for key is empty"""
+    if request_limiter.shared:
+        retry_after = await run_io(request_limiter.acquire, key)
+    else:
+        retry_after = request_limiter.acquire(key)
+    if retry_after:
+        raise too_many_requests(retry_after)
+
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    """Dependency: only admins get past it"""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def rate_limited_user(route: str):
+    """Dependency: authenticate, then spend one token from this user's bucket for route"""
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        await enforce_rate_limit(f"user:{current_user['id']}:{route}")
+        return current_user
+    return dependency
+
+def rate_limited_client(route: str):
+    """Dependency for unauthenticated routes; buckets are per client address"""
+    async def dependency(request: Request):
+        await enforce_rate_limit(f"ip:{request.client.host if request.client else 'unknown'}:{route}")
+    return dependency
+
+# AI Generation (Mock for demo unless a provider key is configured)
+def generate_content(topic: str, platform: str, style: str, fresh: bool = False) -> dict:
+    if GEMINI_API_KEY or OPENAI_API_KEY:
+        return ai_service.generate_content(topic, platform, style, fresh=fresh)
+    
     import random
     import time
     
@@ -180,6 +213,50 @@ def generate_content(topic: str, platform: str, style: str) -> dict:
     
     return platform_content.get(platform, platform_content["instagram"])
 
+async def generate_content_async(topic: str, platform: str, style: str, fresh: bool = False) -> dict:
+    """Native async generation when a provider is configured; the mock still runs on the I/O pool
+    
+    Generation slots only bound provider calls (AIService takes one); the mock makes none, so it doesn't queue.
+    """
+    if GEMINI_API_KEY or OPENAI_API_KEY:
+        return await ai_service.generate_content_async(topic, platform, style, fresh=fresh)
+    return await run_io(generate_content, topic, platform, style, fresh)
+
+async def generate_for_platforms(topic: str, platforms: List[str], style: str, fresh: bool = False) -> List[tuple]:
+    """Generate all platforms concurrently; returns (platform, content, error) tuples in request order
+    
+    Raises RateLimitExceeded when our provider quota ran out (never for callers waiting for quota); platforms
+    that did finish are in the generation cache, so the retry is cheap.
+    """
+    semaphore = asyncio.Semaphore(max(1, GENERATION_CONCURRENCY))
+    
+    async def generate_one(platform: str):
+        async with semaphore:
+            return await generate_content_async(topic, platform, style, fresh)
+    
+    outcomes = await asyncio.gather(*[generate_one(p) for p in platforms], return_exceptions=True)
+    throttled = [outcome for outcome in outcomes if isinstance(outcome, RateLimitExceeded)]
+    if throttled:
+        raise max(throttled, key=lambda e: e.retry_after)
+    return [
+        (platform, None, str(outcome)) if isinstance(outcome, Exception) else (platform, outcome, None)
+        for platform, outcome in zip(platforms, outcomes)
+    ]
+
+async def stream_content_async(topic: str, platform: str, style: str, fresh: bool = False):
+    """Yield ("delta", ...) events then ("done", content); the mock emits each field whole"""
+    if GEMINI_API_KEY or OPENAI_API_KEY:
+        # Streams hold their provider connections for the whole response, so they take a generation slot
+        async with fair_scheduler.slot():
+            async for event in ai_service.stream_content(topic, platform, style, fresh=fresh):
+                yield event
+        return
+    
+    content = await run_io(generate_content, topic, platform, style, fresh)
+    for field in ("caption", "hashtags", "image_prompt"):
+        yield "delta", {"field": field, "text": content[field]}
+    yield "done", content
+
 # Social Media Posting (Mock implementations)
 def post_to_instagram(content: dict, access_token: str) -> bool:
     # Mock Instagram posting
@@ -199,9 +276,22 @@ def post_to_linkedin(content: dict, access_token: str) -> bool:
 # Routes
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    await run_io(init_db)
+    job_queue.start(_run_generation_job)
+    if SCHEDULER_ENABLED:
+        await run_io(dispatcher.start)
     print("🚀 JACAI Pro initialized with database")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    batch_runner.shutdown()
+    await run_io(dispatcher.stop)
+    await job_queue.stop()
+    shutdown_executors()
+    password_hasher.shutdown()
+    http_client.close()
+    await async_http_client.aclose()
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
@@ -210,163 +300,374 @@ async def home(request: Request):
 async def dashboard(request: Request):
     return templates.TemplateResponse("dashboard.html", {"request": request})
 
+def _user_exists(username: str, email: str) -> bool:
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?", (username, email))
+        return cursor.fetchone() is not None
+
+def _insert_user(username: str, email: str, password_hash: bytes):
+    with db.transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Re-check inside the write transaction; hashing happened outside it
+        cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?", (username, email))
+        if cursor.fetchone():
+            raise HTTPException(status_code=400, detail="User already exists")
+        
+        cursor.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+            (username, email, password_hash)
+        )
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": str(password_hasher.retry_after)}
+    )
+
 @app.post("/api/register")
 async def register(user: UserCreate):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    
     # Check if user exists
-    cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?", (user.username, user.email))
-    if cursor.fetchone():
-        conn.close()
+    if await run_io(_user_exists, user.username, user.email):
         raise HTTPException(status_code=400, detail="User already exists")
     
     # Hash password
-    password_hash = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
+    try:
+        password_hash = await password_hasher.hash(user.password)
+    except HashingOverloaded:
+        raise _hashing_busy()
     
     # Insert user
-    cursor.execute(
-        "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
-        (user.username, user.email, password_hash)
-    )
-    conn.commit()
-    conn.close()
+    await run_io(_insert_user, user.username, user.email, password_hash)
+    invalidate_user_cache(user.username)
     
     return {"message": "User created successfully"}
 
+def _load_login_user(username: str):
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ? AND is_active = TRUE", (username,))
+        return cursor.fetchone()
+
+def _update_password_hash(user_id: int, password_hash: bytes):
+    with db.transaction() as conn:
+        conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
 @app.post("/api/login")
 async def login(user: UserLogin):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, username, password_hash FROM users WHERE username = ? AND is_active = TRUE", (user.username,))
-    db_user = cursor.fetchone()
-    conn.close()
+    db_user = await run_io(_load_login_user, user.username)
     
-    if not db_user or not bcrypt.checkpw(user.password.encode('utf-8'), db_user[2]):
+    try:
+        valid = bool(db_user) and await password_hasher.verify(user.password, db_user[2])
+    except HashingOverloaded:
+        raise _hashing_busy()
+    
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Transparently upgrade hashes made with a different cost factor
+    if password_hasher.needs_rehash(db_user[2]):
+        try:
+            await run_io(_update_password_hash, db_user[0], await password_hasher.hash(user.password))
+        except HashingOverloaded:
+            pass  # the upgrade is retried on the next login
+    
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
+def _save_social_account(user_id: int, platform: str, account_name: str, access_token: str, refresh_token: str = None):
+    with db.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO social_accounts (user_id, platform, account_name, access_token, refresh_token) VALUES (?, ?, ?, ?, ?)",
+            (user_id, platform, account_name, access_token, refresh_token)
+        )
+
+def _load_social_accounts(user_id: int, columns: str):
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT {columns} FROM social_accounts WHERE user_id = ? AND is_active = TRUE",
+            (user_id,)
+        )
+        return cursor.fetchall()
+
 @app.post("/api/link-social-account")
 async def link_social_account(account: SocialAccountLink, current_user: dict = Depends(get_current_user)):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO social_accounts (user_id, platform, account_name, access_token) VALUES (?, ?, ?, ?)",
-        (current_user["id"], account.platform, account.account_name, account.access_token)
-    )
-    conn.commit()
-    conn.close()
+    await run_io(_save_social_account, current_user["id"], account.platform, account.account_name, account.access_token)
     
     return {"message": f"{account.platform} account linked successfully"}
 
 @app.get("/api/social-accounts")
 async def get_social_accounts(current_user: dict = Depends(get_current_user)):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT platform, account_name, is_active FROM social_accounts WHERE user_id = ? AND is_active = TRUE",
-        (current_user["id"],)
-    )
-    accounts = cursor.fetchall()
-    conn.close()
+    accounts = await run_io(_load_social_accounts, current_user["id"], "platform, account_name, is_active")
     
     return [{"platform": acc[0], "account_name": acc[1], "is_active": acc[2]} for acc in accounts]
 
-@app.post("/api/generate")
-async def generate_post(request: GenerateRequest, current_user: dict = Depends(get_current_user)):
+def _publish(platform: str, content: dict, access_token: str) -> bool:
+    """Post to social media with the mock platform clients"""
+    if platform == "instagram":
+        return post_to_instagram(content, access_token)
+    elif platform == "twitter":
+        return post_to_twitter(content, access_token)
+    elif platform == "linkedin":
+        return post_to_linkedin(content, access_token)
+    return False
+
+def _persist_generation(user_id: int, request: GenerateRequest, generated: List[tuple]) -> List[int]:
+    """Save every platform's post as a draft in one transaction, then auto-post and mark what went out; returns post ids
+    
+    No connection is held while the platforms are called, and a post is never live without its row.
+    """
+    tokens = {}
+    if request.auto_post and generated:
+        # One lookup for the tokens of every requested platform
+        platforms = list(dict.fromkeys(platform for platform, _ in generated))
+        placeholders = ", ".join("?" for _ in platforms)
+        with db.connection() as conn:
+            tokens = dict(conn.execute(
+                f"SELECT platform, access_token FROM social_accounts WHERE user_id = ? AND platform IN ({placeholders}) AND is_active = TRUE",
+                (user_id, *platforms)
+            ).fetchall())
+    
+    rows = [
+        (user_id, request.topic, platform, request.style, content["caption"], content["hashtags"], content["image_prompt"])
+        for platform, content in generated
+    ]
+    post_ids = db.insert_many(
+        "INSERT INTO generated_posts (user_id, topic, platform, style, caption, hashtags, image_prompt, post_status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')",
+        rows
+    )
+    
+    posted = []
+    for (platform, content), post_id in zip(generated, post_ids):
+        if platform not in tokens:
+            continue
+        try:
+            if _publish(platform, content, tokens[platform]):
+                posted.append(post_id)
+        except Exception as e:
+            print(f"Auto-posting to {platform} failed: {e}")
+    if posted:
+        placeholders = ", ".join("?" for _ in posted)
+        with db.transaction() as conn:
+            conn.execute(
+                f"UPDATE generated_posts SET post_status = 'posted', posted_at = CURRENT_TIMESTAMP WHERE id IN ({placeholders})",
+                posted
+            )
+    
+    return post_ids
+
+async def _run_generation(user_id: int, request: GenerateRequest, weight: float = 1.0) -> dict:
+    """Generate, persist and (optionally) publish; the /api/generate response body"""
     try:
-        results = []
+        # Generate content
+        with generation_as(f"user:{user_id}", INTERACTIVE, weight):
+            outcomes = await generate_for_platforms(request.topic, request.platforms, request.style, request.fresh)
+        generated = [(platform, content) for platform, content, error in outcomes if error is None]
         
-        for platform in request.platforms:
-            # Generate content
-            content = generate_content(request.topic, platform, request.style)
-            
-            # Save to database
-            conn = sqlite3.connect('jacai.db')
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO generated_posts (user_id, topic, platform, style, caption, hashtags, image_prompt) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (current_user["id"], request.topic, platform, request.style, content["caption"], content["hashtags"], content["image_prompt"])
-            )
-            post_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            # Auto-post if requested
-            if request.auto_post:
-                # Get user's social account for this platform
-                conn = sqlite3.connect('jacai.db')
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT access_token FROM social_accounts WHERE user_id = ? AND platform = ? AND is_active = TRUE",
-                    (current_user["id"], platform)
-                )
-                account = cursor.fetchone()
-                conn.close()
-                
-                if account:
-                    # Post to social media
-                    posted = False
-                    if platform == "instagram":
-                        posted = post_to_instagram(content, account[0])
-                    elif platform == "twitter":
-                        posted = post_to_twitter(content, account[0])
-                    elif platform == "linkedin":
-                        posted = post_to_linkedin(content, account[0])
-                    
-                    if posted:
-                        # Update post status
-                        conn = sqlite3.connect('jacai.db')
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "UPDATE generated_posts SET post_status = 'posted', posted_at = CURRENT_TIMESTAMP WHERE id = ?",
-                            (post_id,)
-                        )
-                        conn.commit()
-                        conn.close()
-            
+        post_ids = iter(await run_io(_persist_generation, user_id, request, generated))
+        
+        results = []
+        for platform, content, error in outcomes:
+            if error is not None:
+                results.append({"platform": platform, "error": error, "posted": False})
+                continue
             results.append({
                 "platform": platform,
                 "content": content,
-                "post_id": post_id,
+                "post_id": next(post_ids),
                 "posted": request.auto_post
             })
         
-        return {"success": True, "results": results}
+        return {"success": bool(generated), "results": results}
     
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-@app.get("/api/posts")
-async def get_posts(current_user: dict = Depends(get_current_user)):
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT topic, platform, style, caption, hashtags, created_at, post_status FROM generated_posts WHERE user_id = ? ORDER BY created_at DESC LIMIT 50",
-        (current_user["id"],)
+async def _run_generation_job(user_id: int, request: dict) -> dict:
+    # Nobody is waiting on the response, so wait for provider quota instead of failing
+    wait_for_provider_quota.set(True)
+    result = await _run_generation(user_id, GenerateRequest(**request), await run_io(user_weight, user_id))
+    if not result["success"]:
+        # Raise so the job is stored as failed rather than completed
+        raise RuntimeError(result.get("error") or "; ".join(
+            f"{item['platform']}: {item['error']}" for item in result["results"]
+        ))
+    return result
+
+@app.post("/api/generate")
+async def generate_post(request: GenerateRequest, current_user: dict = Depends(rate_limited_user("generate"))):
+    if not request.async_job:
+        try:
+            return await _run_generation(current_user["id"], request, role_weight(current_user["role"]))
+        except RateLimitExceeded as e:
+            raise too_many_requests(e.retry_after)
+    
+    job_id = await run_io(job_queue.enqueue, current_user["id"], request.dict(exclude={"async_job"}))
+    job_queue.notify()
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"},
+        headers={"Location": f"/api/jobs/{job_id}"}
     )
-    posts = cursor.fetchall()
-    conn.close()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0, current_user: dict = Depends(get_current_user)):
+    """Job status and, once completed, the same body /api/generate returns; wait=N long-polls up to N seconds"""
+    if wait > 0:
+        job = await job_queue.wait(job_id, current_user["id"], min(wait, JOB_MAX_WAIT_SECONDS))
+    else:
+        job = await run_io(job_queue.get, job_id, current_user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/generate/stream")
+async def generate_post_stream(request: GenerateRequest, current_user: dict = Depends(rate_limited_user("generate_stream"))):
+    """Same as /api/generate, but relays provider tokens as server-sent events per platform and field
     
-    return [
-        {
-            "topic": post[0],
-            "platform": post[1],
-            "style": post[2],
-            "caption": post[3],
-            "hashtags": post[4],
-            "created_at": post[5],
-            "status": post[6]
-        }
-        for post in posts
-    ]
+    Events: start, delta {platform, field, text}, done {platform, content}, error {platform, error},
+    saved {results} once the posts are persisted, and end.
+    """
+    async def events():
+        semaphore = asyncio.Semaphore(max(1, GENERATION_CONCURRENCY))
+        queue = asyncio.Queue()
+        
+        async def stream_one(platform: str):
+            try:
+                async with semaphore:
+                    async for event, data in stream_content_async(request.topic, platform, request.style, request.fresh):
+                        await queue.put((platform, event, data))
+            except Exception as e:
+                await queue.put((platform, "error", {"error": str(e)}))
+            finally:
+                await queue.put((platform, None, None))
+        
+        # Tasks copy the context, so their generation slots are attributed to this user
+        with generation_as(f"user:{current_user['id']}", INTERACTIVE, role_weight(current_user["role"])):
+            tasks = [asyncio.ensure_future(stream_one(p)) for p in request.platforms]
+        finished = {}
+        try:
+            yield _sse("start", {"platforms": request.platforms})
+            remaining = len(tasks)
+            while remaining:
+                platform, event, data = await queue.get()
+                if event is None:
+                    remaining -= 1
+                    continue
+                if event == "done":
+                    finished[platform] = data
+                    data = {"content": data}
+                yield _sse(event, {"platform": platform, **data})
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        # Persist in request order, exactly like /api/generate
+        generated = [(p, finished[p]) for p in request.platforms if p in finished]
+        try:
+            post_ids = await run_io(_persist_generation, current_user["id"], request, generated)
+            results = [
+                {"platform": platform, "post_id": post_id, "posted": request.auto_post}
+                for (platform, _), post_id in zip(generated, post_ids)
+            ]
+            yield _sse("saved", {"results": results})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+        yield _sse("end", {"success": bool(generated)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/generate/batch", status_code=202)
+async def generate_batch(request: BatchGenerateRequest, current_user: dict = Depends(rate_limited_user("generate_batch"))):
+    """Queue many (topic, platforms, style) items; results are saved as drafts as they complete"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to generate")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    
+    job = batch_runner.submit(
+        current_user["id"], [item.dict() for item in request.items], request.fresh, generate_content_async,
+        role_weight(current_user["role"])
+    )
+    return {
+        **job.progress(),
+        "status_url": f"/api/generate/batch/{job.id}",
+        "results_url": f"/api/generate/batch/{job.id}/results"
+    }
+
+def _get_batch(batch_id: str, current_user: dict):
+    job = batch_runner.get(batch_id, current_user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+@app.get("/api/generate/batch/{batch_id}")
+async def get_batch_status(batch_id: str, current_user: dict = Depends(get_current_user)):
+    return _get_batch(batch_id, current_user).progress()
+
+@app.get("/api/generate/batch/{batch_id}/results")
+async def download_batch_results(batch_id: str, current_user: dict = Depends(get_current_user)):
+    """Results finished so far as NDJSON, one {index, topic, platform, style, post_id, content | error} per line"""
+    job = _get_batch(batch_id, current_user)
+    results = sorted(job.results, key=lambda result: (result["index"], result["platform"]))
+    
+    return StreamingResponse(
+        (json.dumps(result, ensure_ascii=False) + "\n" for result in results),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="batch-{job.id}.ndjson"'}
+    )
+
+# Fields selectable through /api/posts?fields=..., mapped to generated_posts columns
+POST_FIELDS = {
+    "id": "id",
+    "topic": "topic",
+    "platform": "platform",
+    "style": "style",
+    "caption": "caption",
+    "hashtags": "hashtags",
+    "image_prompt": "image_prompt",
+    "created_at": "created_at",
+    "posted_at": "posted_at",
+    "status": "post_status"
+}
+DEFAULT_POST_FIELDS = ["topic", "platform", "style", "caption", "hashtags", "created_at", "status"]
+
+def _load_posts_page(user_id: int, selected: List[str], cursor: Optional[str], limit: int):
+    with db.connection() as conn:
+        return keyset_page(conn, "generated_posts", POST_FIELDS, selected, "user_id", user_id, "created_at", cursor, limit)
+
+@app.get("/api/posts")
+async def get_posts(response: Response, cursor: Optional[str] = None, limit: int = 50,
+                    fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """List generated posts newest-first; the next page's cursor is returned in X-Next-Cursor"""
+    try:
+        selected = select_fields(fields, POST_FIELDS, DEFAULT_POST_FIELDS)
+        posts, next_cursor = await run_io(
+            _load_posts_page, current_user["id"], selected, cursor, clamp_limit(limit)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return posts
 
 # n8n Integration Endpoints
-@app.post("/api/n8n/generate")
-async def n8n_generate(request: dict):
+@app.post("/api/n8n/generate", dependencies=[Depends(rate_limited_client("n8n_generate"))])
+async def n8n_generate(request: dict, http_request: Request):
     """Endpoint for n8n to generate content"""
     # This endpoint can be called by n8n workflows
     # No authentication required for automation
@@ -374,16 +675,27 @@ async def n8n_generate(request: dict):
     topic = request.get("topic", "motivation")
     platforms = request.get("platforms", ["instagram"])
     style = request.get("style", "professional")
+    fresh = bool(request.get("fresh", False))
+    
+    # Automation traffic yields to people waiting on the dashboard
+    client = http_request.client.host if http_request.client else "unknown"
+    try:
+        with generation_as(f"n8n:{client}", BACKGROUND):
+            outcomes = await generate_for_platforms(topic, platforms, style, fresh)
+    except RateLimitExceeded as e:
+        raise too_many_requests(e.retry_after)
     
     results = []
-    for platform in platforms:
-        content = generate_content(topic, platform, style)
-        results.append({
-            "platform": platform,
-            "content": content
-        })
+    for platform, content, error in outcomes:
+        if error is not None:
+            results.append({"platform": platform, "error": error})
+        else:
+            results.append({
+                "platform": platform,
+                "content": content
+            })
     
-    return {"success": True, "results": results}
+    return {"success": any("content" in r for r in results), "results": results}
 
 @app.get("/link-accounts", response_class=HTMLResponse)
 async def link_accounts_page(request: Request):
@@ -394,7 +706,7 @@ async def oauth_authorize(platform: str, redirect_uri: str, current_user: dict =
     """Start OAuth flow for platform"""
     try:
         from oauth_service import oauth_service
-        auth_url = oauth_service.get_auth_url(platform, current_user["id"], redirect_uri)
+        auth_url = await run_io(oauth_service.get_auth_url, platform, current_user["id"], redirect_uri)
         return {"auth_url": auth_url}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -406,26 +718,22 @@ async def oauth_callback(code: str, state: str, platform: str = None):
         from oauth_service import oauth_service
         
         # Verify state
-        state_data = oauth_service.verify_state(state)
+        state_data = await run_io(oauth_service.verify_state, state)
         user_id = state_data["user_id"]
         platform = state_data["platform"]
         
         # Exchange code for token
         redirect_uri = f"{request.base_url}oauth/callback"
-        token_data = oauth_service.exchange_code_for_token(platform, code, redirect_uri)
+        token_data = await run_io(oauth_service.exchange_code_for_token, platform, code, redirect_uri)
         
         # Get user info
-        user_info = oauth_service.get_user_info(platform, token_data["access_token"])
+        user_info = await run_io(oauth_service.get_user_info, platform, token_data["access_token"])
         
         # Save to database
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO social_accounts (user_id, platform, account_name, access_token, refresh_token) VALUES (?, ?, ?, ?, ?)",
-            (user_id, platform, user_info.get("username", "Unknown"), token_data["access_token"], token_data.get("refresh_token"))
+        await run_io(
+            _save_social_account, user_id, platform, user_info.get("username", "Unknown"),
+            token_data["access_token"], token_data.get("refresh_token")
         )
-        conn.commit()
-        conn.close()
         
         return HTMLResponse("<script>window.close(); window.opener.location.reload();</script>")
         
@@ -435,15 +743,7 @@ async def oauth_callback(code: str, state: str, platform: str = None):
 @app.post("/api/link-social-account")
 async def link_social_account_manual(account: SocialAccountLink, current_user: dict = Depends(get_current_user)):
     """Manually link social account with token"""
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO social_accounts (user_id, platform, account_name, access_token) VALUES (?, ?, ?, ?)",
-        (current_user["id"], account.platform, account.account_name, account.access_token)
-    )
-    conn.commit()
-    conn.close()
+    await run_io(_save_social_account, current_user["id"], account.platform, account.account_name, account.access_token)
     
     return {"message": f"{account.platform} account linked successfully"}
 
@@ -452,19 +752,12 @@ async def test_social_connections(current_user: dict = Depends(get_current_user)
     """Test all linked social media connections"""
     from social_media_service import social_service
     
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT platform, account_name, access_token FROM social_accounts WHERE user_id = ? AND is_active = TRUE",
-        (current_user["id"],)
-    )
-    accounts = cursor.fetchall()
-    conn.close()
+    accounts = await run_io(_load_social_accounts, current_user["id"], "platform, account_name, access_token")
     
     results = []
     for account in accounts:
         platform, account_name, access_token = account
-        test_result = social_service.validate_account(platform, access_token)
+        test_result = await run_io(social_service.validate_account, platform, access_token)
         results.append({
             "platform": platform,
             "account_name": account_name,
@@ -474,23 +767,55 @@ async def test_social_connections(current_user: dict = Depends(get_current_user)
     
     return {"results": results}
 
+def _deactivate_social_account(user_id: int, platform: str):
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE social_accounts SET is_active = FALSE WHERE user_id = ? AND platform = ?",
+            (user_id, platform)
+        )
+
 @app.delete("/api/social-accounts/{platform}")
 async def unlink_social_account(platform: str, current_user: dict = Depends(get_current_user)):
     """Unlink social media account"""
-    conn = sqlite3.connect('jacai.db')
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE social_accounts SET is_active = FALSE WHERE user_id = ? AND platform = ?",
-        (current_user["id"], platform)
-    )
-    conn.commit()
-    conn.close()
+    await run_io(_deactivate_social_account, current_user["id"], platform)
     
     return {"message": f"{platform} account unlinked successfully"}
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "service": "JACAI Pro", "version": "2.0.0"}
+    return {
+        "status": "healthy",
+        "service": "JACAI Pro",
+        "version": "2.0.0",
+        "ai_providers": {name: ai_service.breakers[name].state for name in ai_service.providers()}
+    }
+
+def _table_metrics() -> dict:
+    return {"generation_cache": ai_service.cache.stats(), "jobs": job_queue.stats()}
+
+@app.get("/api/metrics", dependencies=[Depends(require_admin)])
+async def metrics():
+    """Cache and pool counters for monitoring (admins only)"""
+    tables = metrics_cache.get("tables")
+    if tables is None:
+        tables = await run_io(_table_metrics)
+        metrics_cache.set("tables", tables)
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "generation_cache": tables["generation_cache"],
+        "generation_coalescing": ai_service.inflight.stats(),
+        "ai_providers": ai_service.router.stats(),
+        "ai_breakers": {name: breaker.stats() for name, breaker in ai_service.breakers.items()},
+        "rate_limits": {"requests": request_limiter.stats(), "providers": provider_limiter.stats()},
+        "batches": batch_runner.stats(),
+        "generation_queue": fair_scheduler.stats(),
+        "scheduler": dispatcher.stats(),
+        "jobs": tables["jobs"],
+        "http_pool": http_client.stats(),
+        "async_http_pool": async_http_client.stats(),
+        "db_pool": db.stats()
+    }
 
 if __name__ == "__main__":
     print("🚀 Starting JACAI Pro - Multi-User AI Social Media Generator")
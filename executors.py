@@ -0,0 +1,65 @@
+"""
+Execution Pools for JACAI - Keep Blocking Work off the Event Loop
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import IO_THREAD_POOL_SIZE
+
+_io_executor = None
+_background_loop = None
+_lock = threading.Lock()
+
+def io_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for sqlite, HTTP and other blocking I/O"""
+    global _io_executor
+    if _io_executor is None:
+        with _lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(max_workers=IO_THREAD_POOL_SIZE, thread_name_prefix="jacai-io")
+    return _io_executor
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O call on the I/O thread pool; context variables carry over like asyncio.to_thread"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(io_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop thread that sync callers use to drive async code"""
+    global _background_loop
+    if _background_loop is None:
+        with _lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="jacai-async", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+def run_sync(coro, timeout: float = None):
+    """Run a coroutine to completion from synchronous code (never from the background loop itself)"""
+    loop = background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync called from the background loop; await the coroutine instead")
+    
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+def shutdown_executors():
+    """Stop the I/O pool; called from the FastAPI shutdown hook"""
+    global _io_executor
+    with _lock:
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=False)
+            _io_executor = None
@@ -0,0 +1,180 @@
+"""
+Fair Scheduler for JACAI - Per-User Fair Queuing of Generation Work with Priority Classes
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from database import db
+from provider_router import percentile
+from config import GENERATION_SLOTS, FAIR_SHARE_WEIGHTS
+
+# Strict priority order: a lower class only runs when no higher class is waiting
+INTERACTIVE = "interactive"
+SCHEDULED = "scheduled"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, SCHEDULED, BACKGROUND)
+
+# (tenant, class, weight) of the work running in this context; set by the entry points, read by slot()
+generation_context = contextvars.ContextVar("generation_context", default=("anonymous", INTERACTIVE, 1.0))
+
+def role_weight(role: Optional[str]) -> float:
+    """Fair-share weight for a user role; roles missing from FAIR_SHARE_WEIGHTS weigh 1"""
+    return FAIR_SHARE_WEIGHTS.get(role or "", 1.0)
+
+def user_weight(user_id: int) -> float:
+    """role_weight() for a user id; blocking, so call it from a worker thread"""
+    if not FAIR_SHARE_WEIGHTS:
+        return 1.0
+    with db.connection() as conn:
+        row = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
+    return role_weight(row[0] if row else None)
+
+@contextlib.contextmanager
+def generation_as(tenant: str, priority: str = INTERACTIVE, weight: float = 1.0):
+    """Attribute generation work in this block to tenant at the given priority class and fair-share weight"""
+    if weight <= 0:
+        raise ValueError(f"Fair-share weight must be positive, got {weight}")
+    token = generation_context.set((tenant, priority, weight))
+    try:
+        yield
+    finally:
+        generation_context.reset(token)
+
+class _Waiter:
+    __slots__ = ("tenant", "weight", "loop", "future", "enqueued_at", "granted", "cancelled")
+    
+    def __init__(self, tenant: str, weight: float, loop: asyncio.AbstractEventLoop):
+        self.tenant = tenant
+        self.weight = weight
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+
+class _ClassQueue:
+    """Weighted start-time fair queuing across tenants within one priority class"""
+    
+    def __init__(self):
+        self.heap: List[tuple] = []  # (finish_tag, seq, start_tag, waiter)
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.depth = 0
+        self.granted = 0
+        self.waits = deque(maxlen=1000)
+    
+    def push(self, waiter: _Waiter, seq: int):
+        # A tenant with a backlog keeps pushing its own finish tags out; a newly active tenant starts at "now".
+        # Heavier tenants advance more slowly, so they are granted proportionally more slots.
+        start = max(self.virtual_time, self.last_finish.get(waiter.tenant, 0.0))
+        finish = start + 1.0 / waiter.weight
+        self.last_finish[waiter.tenant] = finish
+        heapq.heappush(self.heap, (finish, seq, start, waiter))
+        self.depth += 1
+    
+    def pop(self) -> Optional[_Waiter]:
+        while self.heap:
+            _, _, start, waiter = heapq.heappop(self.heap)
+            if waiter.cancelled:
+                continue
+            self.virtual_time = start
+            self.depth -= 1
+            if not self.heap:
+                # Idle: forget per-tenant history so it doesn't grow with every tenant ever seen
+                self.last_finish.clear()
+            return waiter
+        return None
+
+class FairScheduler:
+    def __init__(self, slots: int = GENERATION_SLOTS):
+        self.slots = max(1, slots)
+        self.active = 0
+        self._lock = threading.Lock()
+        self._queues = {priority: _ClassQueue() for priority in PRIORITY_CLASSES}
+        self._seq = itertools.count()
+    
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant: str = None, priority: str = None, weight: float = None):
+        """Hold one of the shared generation slots; defaults come from generation_context"""
+        default_tenant, default_priority, default_weight = generation_context.get()
+        tenant = tenant or default_tenant
+        queue = self._queues[priority or default_priority]
+        await self._acquire(tenant, weight or default_weight, queue)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    async def _acquire(self, tenant: str, weight: float, queue: _ClassQueue):
+        waiter = _Waiter(tenant, weight, asyncio.get_running_loop())
+        with self._lock:
+            if self.active < self.slots and not any(q.depth for q in self._queues.values()):
+                self.active += 1
+                queue.granted += 1
+                queue.waits.append(0.0)
+                return
+            queue.push(waiter, next(self._seq))
+        
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    waiter.cancelled = True
+                    queue.depth -= 1
+                    raise
+            # Granted while being cancelled: hand the slot on
+            self._release()
+            raise
+    
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+            self._dispatch()
+    
+    def _dispatch(self):
+        # Caller holds the lock
+        while self.active < self.slots:
+            waiter, queue = None, None
+            for priority in PRIORITY_CLASSES:
+                queue = self._queues[priority]
+                waiter = queue.pop()
+                if waiter is not None:
+                    break
+            if waiter is None:
+                return
+            
+            waiter.granted = True
+            self.active += 1
+            queue.granted += 1
+            queue.waits.append(time.monotonic() - waiter.enqueued_at)
+            # Waiters may live on another event loop (e.g. the sync wrapper's background loop)
+            waiter.loop.call_soon_threadsafe(self._wake, waiter.future)
+    
+    @staticmethod
+    def _wake(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            classes = {}
+            for priority, queue in self._queues.items():
+                waits = list(queue.waits)
+                classes[priority] = {
+                    "queue_depth": queue.depth,
+                    "granted": queue.granted,
+                    "waiting_tenants": len({entry[3].tenant for entry in queue.heap if not entry[3].cancelled}),
+                    "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    "p95_wait_ms": round(percentile(waits, 95) * 1000, 1) if waits else 0.0
+                }
+            return {"slots": self.slots, "active": self.active, "classes": classes}
+
+# Global fair scheduler instance
+fair_scheduler = FairScheduler()
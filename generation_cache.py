@@ -0,0 +1,119 @@
+"""
+Generation Cache for JACAI - In-Memory LRU Backed by SQLite
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional
+from cache import TTLCache
+from database import db
+from config import GENERATION_CACHE_ENABLED, GENERATION_CACHE_TTL_SECONDS, GENERATION_CACHE_MEMORY_ITEMS
+
+def cache_key(topic: str, platform: str, style: str, provider: str) -> str:
+    """Stable key for a generation request; topic whitespace and case are normalized"""
+    normalized = " ".join(topic.split()).lower()
+    raw = json.dumps([normalized, platform, style, provider], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _json_size(content: Dict) -> int:
+    return len(json.dumps(content, ensure_ascii=False).encode("utf-8"))
+
+class GenerationCache:
+    # Expired disk rows are purged once every this many writes
+    PURGE_EVERY = 500
+    
+    def __init__(self, ttl: float = GENERATION_CACHE_TTL_SECONDS, memory_items: int = GENERATION_CACHE_MEMORY_ITEMS,
+                 enabled: bool = GENERATION_CACHE_ENABLED):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=memory_items, ttl=ttl, sizeof=_json_size)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Look in memory first, then on disk; disk hits are promoted to memory"""
+        if not self.enabled:
+            return None
+        
+        content = self.memory.get(key)
+        if content is not None:
+            return dict(content)
+        
+        with db.connection() as conn:
+            row = conn.execute(
+                "SELECT content_json, expires_at FROM generation_cache WHERE cache_key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        
+        content = json.loads(row[0])
+        self.memory.set(key, content, ttl=max(0.0, row[1] - time.time()))
+        return dict(content)
+    
+    def set(self, key: str, content: Dict):
+        """Store successful generations; fallback content is never cached"""
+        if not self.enabled or content.get("ai_provider") == "fallback" or "error" in content:
+            return
+        
+        content = dict(content)
+        payload = json.dumps(content, ensure_ascii=False)
+        now = time.time()
+        self.memory.set(key, content)
+        
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generation_cache (cache_key, content_json, size_bytes, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now, now + self.ttl)
+            )
+        
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+    
+    def purge_expired(self) -> int:
+        with db.transaction() as conn:
+            return conn.execute("DELETE FROM generation_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+    
+    def clear(self):
+        self.memory.clear()
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM generation_cache")
+    
+    def stats(self) -> dict:
+        """Hit ratio across both tiers plus byte sizes"""
+        with db.connection() as conn:
+            entries, size_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM generation_cache WHERE expires_at > ?",
+                (time.time(),)
+            ).fetchone()
+        
+        memory = self.memory.stats()
+        with self._lock:
+            # Memory misses include requests that then hit disk, so only count final misses
+            lookups = memory["hits"] + self.disk_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl,
+                "memory_hits": memory["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((memory["hits"] + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": memory["size"],
+                "memory_bytes": memory["size_bytes"],
+                "disk_entries": entries,
+                "disk_bytes": size_bytes
+            }
+
+# Global generation cache instance
+generation_cache = GenerationCache()
@@ -0,0 +1,177 @@
+"""
+Shared HTTP Client for JACAI - Keep-Alive Connection Pooling for Outbound Calls
+"""
+import asyncio
+import contextlib
+import threading
+import weakref
+from typing import Dict
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import HTTP_POOL_HOSTS, HTTP_POOL_PER_HOST, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+
+class HTTPClient:
+    def __init__(self, pool_hosts: int = HTTP_POOL_HOSTS, per_host: int = HTTP_POOL_PER_HOST,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT):
+        self.pool_hosts = pool_hosts
+        self.per_host = per_host
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+    
+    def session(self) -> requests.Session:
+        """Lazily build the pooled session; pool_block caps open connections per host"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.per_host, pool_block=True)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._adapter = adapter
+                    self._session = session
+        return self._session
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send through the shared pool with the default (connect, read) timeouts"""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests_sent += 1
+        return self.session().request(method, url, **kwargs)
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+    
+    def stats(self) -> dict:
+        """Per-host request and connection counts; connections < requests means keep-alive is working"""
+        hosts = {}
+        if self._adapter is not None:
+            for key in list(self._adapter.poolmanager.pools.keys()):
+                pool = self._adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+                hosts[host] = {
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle_connections": pool.pool.qsize() if pool.pool else 0
+                }
+        
+        requests_sent = self.requests_sent
+        opened = sum(h["connections_opened"] for h in hosts.values())
+        return {
+            "per_host_limit": self.per_host,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "reuse_ratio": round(1 - opened / requests_sent, 4) if requests_sent else 0.0,
+            "hosts": hosts
+        }
+    
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+                self._adapter = None
+
+try:
+    import h2  # noqa: F401 - presence enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class AsyncHTTPClient:
+    def __init__(self, max_connections: int = HTTP_POOL_HOSTS * HTTP_POOL_PER_HOST, per_host: int = HTTP_POOL_PER_HOST,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.per_host = per_host
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = HTTP2_AVAILABLE
+        # httpx clients (and asyncio semaphores) are bound to the event loop they were first used on
+        self._clients = weakref.WeakKeyDictionary()
+        self._host_slots = weakref.WeakKeyDictionary()
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+    
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+                self._clients[loop] = client
+            return client
+    
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, url: str):
+        """Per-host cap on in-flight requests, so one slow provider can't take every pooled connection"""
+        loop = asyncio.get_running_loop()
+        host = urlsplit(str(url)).netloc
+        with self._lock:
+            slots: Dict[str, asyncio.Semaphore] = self._host_slots.setdefault(loop, {})
+            slot = slots.get(host)
+            if slot is None:
+                slot = slots[host] = asyncio.Semaphore(self.per_host)
+            self.requests_sent += 1
+        async with slot:
+            with self._lock:
+                self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight[host] -= 1
+                    if not self._in_flight[host]:
+                        del self._in_flight[host]
+    
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self._host_slot(url):
+            return await self.client().request(method, url, **kwargs)
+    
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+    
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+    
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        """Streaming request context manager on the pooled client; holds a host slot until the body is done"""
+        async with self._host_slot(url):
+            async with self.client().stream(method, url, **kwargs) as response:
+                yield response
+    
+    async def aclose(self):
+        """Close the client owned by the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.pop(loop, None)
+            self._host_slots.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "http2": self.http2,
+                "event_loops": len(self._clients),
+                "max_connections": self.limits.max_connections,
+                "per_host_limit": self.per_host,
+                "in_flight": dict(self._in_flight),
+                "requests": self.requests_sent
+            }
+
+# Global HTTP client instances
+http_client = HTTPClient()
+async_http_client = AsyncHTTPClient()
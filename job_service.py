@@ -0,0 +1,228 @@
+"""
+Generation Jobs for JACAI - Durable SQLite-Backed Queue for Async /api/generate
+"""
+import asyncio
+import json
+import logging
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from database import db
+from executors import run_io
+from config import JOB_WORKERS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS
+
+FINISHED = ("completed", "failed")
+
+logger = logging.getLogger(__name__)
+
+def _job_dict(row) -> dict:
+    job_id, status, result_json, error, attempts, created_at, started_at, finished_at = row
+    return {
+        "job_id": job_id,
+        "status": status,
+        "result": json.loads(result_json) if result_json else None,
+        "error": error,
+        "attempts": attempts,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at
+    }
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, poll_seconds: float = JOB_POLL_SECONDS):
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+        self.processed = 0
+        self.failed = 0
+    
+    def enqueue(self, user_id: int, request: dict) -> str:
+        job_id = secrets.token_urlsafe(12)
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO generation_jobs (id, user_id, request_json, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, user_id, json.dumps(request, ensure_ascii=False), time.time())
+            )
+        return job_id
+    
+    def notify(self):
+        """Wake an idle worker in this process; call on the worker loop after enqueue"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    def get(self, job_id: str, user_id: int) -> Optional[dict]:
+        with db.connection() as conn:
+            row = conn.execute(
+                "SELECT id, status, result_json, error, attempts, created_at, started_at, finished_at "
+                "FROM generation_jobs WHERE id = ? AND user_id = ?",
+                (job_id, user_id)
+            ).fetchone()
+        return _job_dict(row) if row else None
+    
+    def claim(self) -> Optional[tuple]:
+        """Atomically take the oldest queued job, or a running one whose lease expired (its worker died)"""
+        now = time.time()
+        with db.immediate() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, user_id, request_json, attempts FROM generation_jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                
+                job_id, user_id, request_json, attempts = row
+                if attempts < self.max_attempts:
+                    break
+                conn.execute(
+                    "UPDATE generation_jobs SET status = 'failed', error = ?, finished_at = ?, "
+                    "lease_expires_at = NULL WHERE id = ?",
+                    (f"Abandoned after {attempts} attempts", now, job_id)
+                )
+            
+            conn.execute(
+                "UPDATE generation_jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                "lease_expires_at = ? WHERE id = ?",
+                (now, now + self.lease_seconds, job_id)
+            )
+        return job_id, user_id, json.loads(request_json)
+    
+    def finish(self, job_id: str, result: dict = None, error: str = None):
+        with db.transaction() as conn:
+            conn.execute(
+                "UPDATE generation_jobs SET status = ?, result_json = ?, error = ?, finished_at = ?, "
+                "lease_expires_at = NULL WHERE id = ?",
+                (
+                    "failed" if error is not None else "completed",
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error, time.time(), job_id
+                )
+            )
+    
+    def renew(self, job_id: str) -> bool:
+        """Push a running job's lease out again; False if it is no longer running"""
+        with db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE generation_jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id)
+            )
+        return cursor.rowcount > 0
+    
+    async def _keep_leased(self, job_id: str):
+        """Renew the lease every third of its length so a slow job is not re-run by another worker"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await run_io(self.renew, job_id):
+                    return
+            except Exception:
+                logger.exception("Renewing lease for job %s failed", job_id)
+    
+    def requeue(self, job_id: str):
+        with db.transaction() as conn:
+            conn.execute(
+                "UPDATE generation_jobs SET status = 'queued', lease_expires_at = NULL WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+    
+    async def wait(self, job_id: str, user_id: int, timeout: float) -> Optional[dict]:
+        """Long-poll: return once the job finishes or timeout elapses"""
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                job = await run_io(self.get, job_id, user_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                
+                # Jobs finished in this process wake us immediately; poll for ones finished elsewhere
+                event = self._finished.setdefault(job_id, asyncio.Event())
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_seconds))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._finished.pop(job_id, None)
+    
+    def start(self, handler: Callable[[int, dict], Awaitable[dict]]):
+        """Start worker tasks on the running loop; handler(user_id, request) returns the job result"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker(handler)) for _ in range(self.workers)]
+    
+    async def _worker(self, handler):
+        while True:
+            try:
+                if await self._process_next(handler):
+                    continue
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A busy or failing database must not kill the worker; a job it held is retried once its lease expires
+                logger.exception("Job worker error; retrying in %ss", self.poll_seconds)
+                await asyncio.sleep(self.poll_seconds)
+    
+    async def _process_next(self, handler) -> bool:
+        """Claim and run one job; False when none was waiting"""
+        claimed = await run_io(self.claim)
+        if claimed is None:
+            return False
+        
+        job_id, user_id, request = claimed
+        heartbeat = asyncio.ensure_future(self._keep_leased(job_id))
+        try:
+            result, error = await handler(user_id, request), None
+            self.processed += 1
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next process picks it up without waiting out the lease
+            try:
+                self.requeue(job_id)
+            except Exception:
+                logger.exception("Requeueing job %s failed; it is retried once its lease expires", job_id)
+            raise
+        except Exception as e:
+            result, error = None, str(e)
+            self.failed += 1
+        finally:
+            heartbeat.cancel()
+        
+        await run_io(self.finish, job_id, result, error)
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+        return True
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def stats(self) -> dict:
+        with db.connection() as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM generation_jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall())
+        return {
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0)
+        }
+
+# Global job queue instance
+job_queue = JobQueue()
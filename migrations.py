@@ -0,0 +1,244 @@
+"""
+Schema Migrations for JACAI - Versioned via PRAGMA user_version
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+def _baseline_tables(cursor: sqlite3.Cursor):
+    """Tables that used to be created ad hoc by init_db / init_scheduler_db / OAuthService"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS social_accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            platform TEXT NOT NULL,
+            account_name TEXT,
+            access_token TEXT,
+            refresh_token TEXT,
+            expires_at TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS generated_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            style TEXT NOT NULL,
+            caption TEXT,
+            hashtags TEXT,
+            image_prompt TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            posted_at TIMESTAMP,
+            post_status TEXT DEFAULT 'draft',
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT NOT NULL,
+            platforms TEXT NOT NULL,
+            style TEXT NOT NULL,
+            scheduled_time TIMESTAMP NOT NULL,
+            status TEXT DEFAULT 'pending',
+            content_json TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            posted_at TIMESTAMP,
+            error_message TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS automation_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            topic_template TEXT,
+            platforms TEXT NOT NULL,
+            style TEXT NOT NULL,
+            frequency TEXT NOT NULL,
+            time_slots TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS oauth_states (
+            state TEXT PRIMARY KEY,
+            user_id INTEGER,
+            platform TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    ''')
+
+def _hot_query_indexes(cursor: sqlite3.Cursor):
+    """Indexes for the post listing, pending-post and social account lookups"""
+    # Keep only the newest row per (user_id, platform) before enforcing uniqueness
+    cursor.execute('''
+        DELETE FROM social_accounts
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM social_accounts GROUP BY user_id, platform
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_social_accounts_user_platform
+        ON social_accounts (user_id, platform)
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_generated_posts_user_created
+        ON generated_posts (user_id, created_at, id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_scheduled_posts_status_time
+        ON scheduled_posts (status, scheduled_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_scheduled_posts_user_time
+        ON scheduled_posts (user_id, scheduled_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_oauth_states_expires
+        ON oauth_states (expires_at)
+    ''')
+    # users.username is already covered by the UNIQUE constraint's implicit index
+    cursor.execute("ANALYZE")
+
+def _generation_cache(cursor: sqlite3.Cursor):
+    """Persistent tier of the AIService generation cache"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS generation_cache (
+            cache_key TEXT PRIMARY KEY,
+            content_json TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_generation_cache_expires
+        ON generation_cache (expires_at)
+    ''')
+
+def _rate_limit_buckets(cursor: sqlite3.Cursor):
+    """Token buckets shared by worker processes when RATE_LIMIT_BACKEND=sqlite"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket_key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+def _generation_jobs(cursor: sqlite3.Cursor):
+    """Durable queue for /api/generate requests made in async job mode"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            request_json TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result_json TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_expires_at REAL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_generation_jobs_status_created
+        ON generation_jobs (status, created_at)
+    ''')
+
+def _scheduled_post_leases(cursor: sqlite3.Cursor):
+    """Claim columns so several scheduler workers can share scheduled_posts"""
+    cursor.execute("ALTER TABLE scheduled_posts ADD COLUMN worker_id TEXT")
+    cursor.execute("ALTER TABLE scheduled_posts ADD COLUMN lease_expires_at REAL")
+    cursor.execute("ALTER TABLE scheduled_posts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_scheduled_posts_status_lease
+        ON scheduled_posts (status, lease_expires_at)
+    ''')
+
+def _automation_rule_expansion(cursor: sqlite3.Cursor):
+    """High-water mark per rule, and a link from generated posts back to their rule"""
+    cursor.execute("ALTER TABLE automation_rules ADD COLUMN expanded_until TIMESTAMP")
+    cursor.execute("ALTER TABLE scheduled_posts ADD COLUMN rule_id INTEGER")
+    # Makes re-expanding an overlapping window (or two workers expanding at once) a no-op
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_scheduled_posts_rule_time
+        ON scheduled_posts (rule_id, scheduled_time) WHERE rule_id IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS ix_automation_rules_active_expanded
+        ON automation_rules (is_active, expanded_until)
+    ''')
+
+# Ordered (version, description, apply) entries; never edit an applied entry, append a new one
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "baseline tables", _baseline_tables),
+    (2, "hot query indexes and unique social accounts", _hot_query_indexes),
+    (3, "generation cache", _generation_cache),
+    (4, "rate limit buckets", _rate_limit_buckets),
+    (5, "generation jobs", _generation_jobs),
+    (6, "scheduled post leases", _scheduled_post_leases),
+    (7, "automation rule expansion", _automation_rule_expansion),
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Current schema version stored in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def run_migrations(conn: sqlite3.Connection, target: int = None) -> int:
+    """Apply pending migrations up to target (default: latest); returns the resulting version"""
+    if conn.in_transaction:
+        conn.commit()
+    
+    current = schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        if current >= version:
+            continue
+        
+        # BEGIN IMMEDIATE serializes concurrent workers migrating the same file
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            
+            apply(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            current = version
+            print(f"🗄️ Applied migration {version}: {description}")
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return schema_version(conn)
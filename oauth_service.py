@@ -1,12 +1,12 @@
 """
 OAuth Service for Social Media Account Linking
 """
-import requests
 import json
 from urllib.parse import urlencode, parse_qs
 from config import *
 import secrets
-import sqlite3
+from database import db
+from http_client import http_client
 from datetime import datetime, timedelta
 
 class OAuthService:
@@ -60,51 +60,35 @@ class OAuthService:
         }
         
         # Store state in database for verification
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS oauth_states (
-                state TEXT PRIMARY KEY,
-                user_id INTEGER,
-                platform TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP
-            )
-        ''')
-        
-        state = secrets.token_urlsafe(32)
-        expires_at = datetime.now() + timedelta(minutes=10)
-        
-        cursor.execute('''
-            INSERT INTO oauth_states (state, user_id, platform, expires_at)
-            VALUES (?, ?, ?, ?)
-        ''', (state, user_id, platform, expires_at))
-        
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            state = secrets.token_urlsafe(32)
+            expires_at = datetime.now() + timedelta(minutes=10)
+            
+            cursor.execute('''
+                INSERT INTO oauth_states (state, user_id, platform, expires_at)
+                VALUES (?, ?, ?, ?)
+            ''', (state, user_id, platform, expires_at))
         
         return state
     
     def verify_state(self, state: str) -> dict:
         """Verify OAuth state parameter"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT user_id, platform, expires_at
-            FROM oauth_states
-            WHERE state = ?
-        ''', (state,))
-        
-        result = cursor.fetchone()
-        
-        if result:
-            # Clean up used state
-            cursor.execute('DELETE FROM oauth_states WHERE state = ?', (state,))
-            conn.commit()
-        
-        conn.close()
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT user_id, platform, expires_at
+                FROM oauth_states
+                WHERE state = ?
+            ''', (state,))
+            
+            result = cursor.fetchone()
+            
+            if result:
+                # Clean up used state
+                cursor.execute('DELETE FROM oauth_states WHERE state = ?', (state,))
         
         if not result:
             raise ValueError("Invalid state parameter")
@@ -132,7 +116,7 @@ class OAuthService:
             "redirect_uri": redirect_uri
         }
         
-        response = requests.post(config["token_url"], data=data)
+        response = http_client.post(config["token_url"], data=data)
         
         if response.status_code == 200:
             return response.json()
@@ -149,7 +133,7 @@ class OAuthService:
         
         headers = {"Authorization": f"Bearer {access_token}"}
         
-        response = requests.get(endpoints[platform], headers=headers)
+        response = http_client.get(endpoints[platform], headers=headers)
         
         if response.status_code == 200:
             return response.json()
@@ -0,0 +1,74 @@
+"""
+Keyset Pagination Helpers for JACAI - Cursor Encoding and Field Projection
+"""
+import base64
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+from config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+
+# SQLite integers are signed 64-bit; larger Python ints raise OverflowError when bound
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+def _bindable_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    """Opaque cursor pointing just past (sort_value, row_id)"""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    # Only values encode_cursor can produce; anything else would reach SQLite as an unbindable parameter
+    if not (isinstance(sort_value, (str, float, type(None))) or _bindable_int(sort_value)):
+        raise ValueError("Invalid cursor")
+    if not _bindable_int(row_id):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Keep page sizes within configured bounds"""
+    if not limit:
+        return PAGE_SIZE_DEFAULT
+    return max(1, min(int(limit), PAGE_SIZE_MAX))
+
+def select_fields(fields: Optional[str], allowed: Dict[str, str], default: List[str]) -> List[str]:
+    """Parse a comma separated fields= parameter against the allowed field -> column map"""
+    if not fields:
+        return list(default)
+    
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+def keyset_page(conn: sqlite3.Connection, table: str, allowed: Dict[str, str], fields: List[str],
+                owner_column: str, owner_id: int, sort_column: str, cursor: Optional[str],
+                limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """Fetch one page newest-first ordered by (sort_column, id); returns (rows, next_cursor)"""
+    columns = [allowed[f] for f in fields]
+    select = columns + [sort_column, "id"]
+    
+    sql = f"SELECT {', '.join(select)} FROM {table} WHERE {owner_column} = ?"
+    params: list = [owner_id]
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        sql += f" AND ({sort_column}, id) < (?, ?)"
+        params.extend([sort_value, row_id])
+    sql += f" ORDER BY {sort_column} DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    items = [dict(zip(fields, row[:len(fields)])) for row in rows]
+    next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1]) if has_more and rows else None
+    return items, next_cursor
@@ -0,0 +1,97 @@
+"""
+Password Hashing Service for JACAI - Process Pool with Admission Control
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full; callers should answer 503 with Retry-After"""
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+def _check(password: bytes, password_hash: bytes) -> bool:
+    return bcrypt.checkpw(password, password_hash)
+
+def hash_cost(password_hash) -> int:
+    """Cost factor encoded in a bcrypt hash ($2b$<cost>$...), or 0 if unreadable"""
+    try:
+        if isinstance(password_hash, bytes):
+            password_hash = password_hash.decode("ascii")
+        return int(password_hash.split("$")[2])
+    except (ValueError, IndexError, UnicodeDecodeError):
+        return 0
+
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.rounds = rounds
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self.retry_after = 1
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Fork would copy a process that already runs the I/O pool, event loop and scheduler threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+            return self._executor
+    
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingOverloaded(f"{self._pending} password hashes already queued")
+            self._pending += 1
+        
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+    
+    async def hash(self, password: str) -> bytes:
+        """Hash with the configured cost factor"""
+        return await self._submit(_hash, password.encode("utf-8"), self.rounds)
+    
+    async def verify(self, password: str, password_hash) -> bool:
+        if isinstance(password_hash, str):
+            password_hash = password_hash.encode("utf-8")
+        return await self._submit(_check, password.encode("utf-8"), password_hash)
+    
+    def needs_rehash(self, password_hash) -> bool:
+        """True when the stored hash was made with a different cost factor"""
+        return hash_cost(password_hash) != self.rounds
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+# Global password hasher instance
+password_hasher = PasswordHasher()
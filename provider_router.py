@@ -0,0 +1,114 @@
+"""
+Provider Router for JACAI - Latency-Aware AI Provider Selection and Hedged Requests
+"""
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+from config import AI_ROUTING_WINDOW, AI_ROUTING_MIN_SAMPLES, AI_ROUTING_ERROR_THRESHOLD, AI_HEDGING_ENABLED
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+class ProviderStats:
+    """Rolling window of the last N outcomes for one provider"""
+    
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)  # successful calls only
+        self.outcomes = deque(maxlen=window)   # True = success
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+    
+    def record(self, latency: float, ok: bool, censored: bool = False):
+        self.requests += 1
+        if censored:
+            # Cancelled before finishing (a hedging loser): the real latency is unknown, and only known to be
+            # longer than the winner's, so it is neither a latency sample nor an outcome
+            self.cancelled += 1
+            return
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+    
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+    
+    def latency(self, pct: float) -> Optional[float]:
+        return percentile(list(self.latencies), pct) if self.latencies else None
+
+class ProviderRouter:
+    def __init__(self, window: int = AI_ROUTING_WINDOW, min_samples: int = AI_ROUTING_MIN_SAMPLES,
+                 error_threshold: float = AI_ROUTING_ERROR_THRESHOLD, hedging: bool = AI_HEDGING_ENABLED):
+        self.window = window
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.hedging = hedging
+        self._stats: Dict[str, ProviderStats] = {}
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+    
+    def _provider(self, name: str) -> ProviderStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ProviderStats(self.window)
+        return stats
+    
+    def record(self, provider: str, latency: float, ok: bool, censored: bool = False):
+        with self._lock:
+            self._provider(provider).record(latency, ok, censored)
+    
+    def ranked(self, providers: List[str]) -> List[str]:
+        """Healthy providers by median latency; providers with no latency data yet go after measured ones
+        
+        Unmeasured providers still get traffic through hedges and failovers, which is how they warm up.
+        """
+        with self._lock:
+            def sort_key(name: str):
+                stats = self._provider(name)
+                unhealthy = len(stats.outcomes) >= self.min_samples and stats.error_rate() >= self.error_threshold
+                median = stats.latency(50)
+                return (unhealthy, median is None, median or 0.0)
+            # sorted() is stable, so the caller's order breaks ties
+            return sorted(providers, key=sort_key)
+    
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """p95 latency once there is enough data; None means don't hedge yet"""
+        if not self.hedging:
+            return None
+        with self._lock:
+            stats = self._provider(provider)
+            if len(stats.latencies) < self.min_samples:
+                return None
+            return stats.latency(95)
+    
+    def count(self, event: str):
+        with self._lock:
+            setattr(self, event, getattr(self, event) + 1)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            providers = {}
+            for name, stats in self._stats.items():
+                p50, p95 = stats.latency(50), stats.latency(95)
+                providers[name] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "cancelled": stats.cancelled,
+                    "error_rate": round(stats.error_rate(), 4),
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+                }
+            return {
+                "hedging": self.hedging,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "providers": providers
+            }
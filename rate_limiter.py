@@ -0,0 +1,129 @@
+"""
+Rate Limiter for JACAI - Token Buckets per User, Route and AI Provider
+"""
+import threading
+import time
+from typing import Dict, List, Tuple
+from database import db
+from config import RATE_LIMIT_PER_MINUTE, RATE_LIMIT_PER_HOUR, RATE_LIMIT_BACKEND, AI_PROVIDER_RATE_PER_MINUTE
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {key}, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def _refill(tokens: float, updated_at: float, capacity: int, period: float, now: float) -> float:
+    return min(capacity, tokens + (now - updated_at) * capacity / period)
+
+def _wait_time(tokens: float, cost: float, capacity: int, period: float) -> float:
+    return max(0.0, (cost - tokens) * period / capacity)
+
+class TokenBucketLimiter:
+    # Idle buckets are dropped once every this many acquisitions; a full bucket is the same as no bucket
+    PRUNE_EVERY = 1000
+    
+    def __init__(self, limits: List[Tuple[int, float]], backend: str = "memory"):
+        """limits: (capacity, period_seconds) pairs that must all have a token, e.g. per minute and per hour"""
+        self.limits = [(capacity, period) for capacity, period in limits if capacity > 0]
+        self.backend = backend
+        self.shared = backend == "sqlite"
+        self._buckets: Dict[str, List[List[float]]] = {}
+        self._lock = threading.Lock()
+        self._acquisitions = 0
+        self.allowed = 0
+        self.rejected = 0
+    
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """Take a token from every bucket for key; returns 0 when allowed, else seconds until it would be"""
+        if not self.limits:
+            return 0.0
+        
+        now = time.time()
+        retry_after = self._acquire_sqlite(key, cost, now) if self.shared else self._acquire_memory(key, cost, now)
+        
+        with self._lock:
+            if retry_after:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+            self._acquisitions += 1
+            prune = self._acquisitions % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune(now)
+        return retry_after
+    
+    def check(self, key: str, cost: float = 1.0):
+        """acquire(), raising RateLimitExceeded instead of returning a wait"""
+        retry_after = self.acquire(key, cost)
+        if retry_after:
+            raise RateLimitExceeded(key, retry_after)
+    
+    def _acquire_memory(self, key: str, cost: float, now: float) -> float:
+        with self._lock:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                buckets = self._buckets[key] = [[capacity, now] for capacity, _ in self.limits]
+            
+            levels = [_refill(tokens, updated, capacity, period, now)
+                      for (tokens, updated), (capacity, period) in zip(buckets, self.limits)]
+            retry_after = max(_wait_time(level, cost, capacity, period)
+                              for level, (capacity, period) in zip(levels, self.limits))
+            if retry_after:
+                return retry_after
+            
+            for bucket, level in zip(buckets, levels):
+                bucket[0], bucket[1] = level - cost, now
+            return 0.0
+    
+    def _acquire_sqlite(self, key: str, cost: float, now: float) -> float:
+        bucket_keys = [f"{key}|{int(period)}" for _, period in self.limits]
+        placeholders = ", ".join("?" for _ in bucket_keys)
+        
+        with db.immediate() as conn:
+            stored = dict((row[0], (row[1], row[2])) for row in conn.execute(
+                f"SELECT bucket_key, tokens, updated_at FROM rate_limit_buckets WHERE bucket_key IN ({placeholders})",
+                bucket_keys
+            ))
+            
+            levels = []
+            for bucket_key, (capacity, period) in zip(bucket_keys, self.limits):
+                tokens, updated = stored.get(bucket_key, (capacity, now))
+                levels.append(_refill(tokens, updated, capacity, period, now))
+            retry_after = max(_wait_time(level, cost, capacity, period)
+                              for level, (capacity, period) in zip(levels, self.limits))
+            if retry_after:
+                conn.rollback()
+                return retry_after
+            
+            conn.executemany(
+                "INSERT OR REPLACE INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?)",
+                [(bucket_key, level - cost, now) for bucket_key, level in zip(bucket_keys, levels)]
+            )
+            return 0.0
+    
+    def prune(self, now: float = None):
+        """Forget buckets that have refilled completely"""
+        now = now or time.time()
+        longest = max(period for _, period in self.limits)
+        if self.shared:
+            with db.transaction() as conn:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - longest,))
+            return
+        
+        with self._lock:
+            for key in [k for k, buckets in self._buckets.items() if all(now - b[1] >= longest for b in buckets)]:
+                del self._buckets[key]
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "limits": [{"capacity": capacity, "period_seconds": period} for capacity, period in self.limits],
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "tracked_keys": len(self._buckets) if not self.shared else None
+            }
+
+# Global limiters: API requests per user/route, and upstream AI calls per provider
+request_limiter = TokenBucketLimiter([(RATE_LIMIT_PER_MINUTE, 60), (RATE_LIMIT_PER_HOUR, 3600)], RATE_LIMIT_BACKEND)
+provider_limiter = TokenBucketLimiter([(AI_PROVIDER_RATE_PER_MINUTE, 60)], RATE_LIMIT_BACKEND)
@@ -0,0 +1,116 @@
+"""
+Recurrence Rules for JACAI - Cron-Like Frequencies for Automation Rules
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List, Set
+
+# Named frequencies expand to the cron day fields "day-of-month month day-of-week" with times from time_slots,
+# or to a full 5-field expression that carries its own times
+NAMED_FREQUENCIES = {
+    "hourly": "0 * * * *",
+    "daily": "* * *",
+    "weekdays": "* * mon-fri",
+    "weekends": "* * sat,sun",
+    "weekly": "* * mon",
+    "monthly": "1 * *",
+}
+MONTH_NAMES = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+def _parse_value(value: str, names: List[str], offset: int) -> int:
+    value = value.lower()
+    if value in names:
+        return names.index(value) + offset
+    return int(value)
+
+def _parse_field(field: str, low: int, high: int, names: List[str] = None, offset: int = 0) -> Set[int]:
+    """One cron field: *, n, a-b, a,b and /step, with optional three-letter names"""
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (_parse_value(v, names or [], offset) for v in spec.split("-", 1))
+        else:
+            start = _parse_value(spec, names or [], offset)
+            end = high if step > 1 else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def _parse_slot(slot: str) -> time:
+    hour, _, minute = slot.strip().partition(":")
+    return time(int(hour), int(minute or 0))
+
+class Recurrence:
+    """When an automation rule fires: a named frequency or day fields plus time_slots, or a full 5-field cron"""
+    
+    def __init__(self, frequency: str, time_slots: List[str] = None):
+        expression = NAMED_FREQUENCIES.get(frequency.strip().lower(), frequency)
+        fields = expression.split()
+        if len(fields) == 5 and time_slots:
+            raise ValueError(f"{frequency} sets its own times; time_slots can't be combined with it")
+        try:
+            if len(fields) == 5:
+                minutes = _parse_field(fields[0], 0, 59)
+                hours = _parse_field(fields[1], 0, 23)
+                self.times = sorted(time(h, m) for h in hours for m in minutes)
+                fields = fields[2:]
+            elif len(fields) == 3:
+                self.times = sorted({_parse_slot(slot) for slot in time_slots or []})
+            else:
+                raise ValueError(f"Unknown frequency: {frequency}")
+            
+            self.days = _parse_field(fields[0], 1, 31)
+            self.months = _parse_field(fields[1], 1, 12, MONTH_NAMES, 1)
+            # Cron accepts 7 for Sunday as well as 0
+            self.weekdays = {d % 7 for d in _parse_field(fields[2], 0, 7, DAY_NAMES)}
+        except ValueError:
+            raise ValueError(f"Invalid frequency or time slots: {frequency} {time_slots or []}")
+        if not self.times:
+            raise ValueError("At least one time slot is required")
+        self.any_day = fields[0] == "*"
+        self.any_weekday = fields[2] == "*"
+        
+        # Closest two occurrences can be: within a day, or from the last time of one day to the first of the next
+        minutes = [at.hour * 60 + at.minute for at in self.times]
+        self.shortest_gap = timedelta(minutes=min(
+            [later - earlier for earlier, later in zip(minutes, minutes[1:])] + [24 * 60 - minutes[-1] + minutes[0]]
+        ))
+    
+    def matches(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+        on_day = day.day in self.days
+        on_weekday = (day.weekday() + 1) % 7 in self.weekdays
+        # As in cron, restricting both day-of-month and day-of-week means either may match
+        if not self.any_day and not self.any_weekday:
+            return on_day or on_weekday
+        return on_day and on_weekday
+    
+    def between(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        """Occurrences after start, up to and including end, in order"""
+        day = start.date()
+        while day <= end.date():
+            if self.matches(day):
+                for at in self.times:
+                    when = datetime.combine(day, at)
+                    if start < when <= end:
+                        yield when
+            day += timedelta(days=1)
+
+TOPIC_PLACEHOLDERS = {
+    "date": "%Y-%m-%d",
+    "time": "%H:%M",
+    "weekday": "%A",
+    "month": "%B",
+}
+_PLACEHOLDER = re.compile(r"\{(" + "|".join(TOPIC_PLACEHOLDERS) + r")\}")
+
+def render_topic(template: str, when: datetime) -> str:
+    """Fill {date}, {time}, {weekday} and {month} in a topic template; any other braces are left alone"""
+    return _PLACEHOLDER.sub(lambda match: when.strftime(TOPIC_PLACEHOLDERS[match.group(1)]), template)
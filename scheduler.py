@@ -1,74 +1,222 @@
 """
 Content Scheduler for JACAI - Automated Posting
 """
-import sqlite3
 from datetime import datetime, timedelta
 import asyncio
-from typing import List, Dict
+import functools
+import heapq
+import itertools
+import os
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
 import json
 from social_media_service import social_service
-from ai_service import ai_service
+from ai_service import ai_service, wait_for_provider_quota
+from executors import run_io, run_sync, background_loop
+from fair_scheduler import generation_as, user_weight, SCHEDULED, BACKGROUND
+from database import db
+from pagination import clamp_limit, keyset_page, select_fields
+from recurrence import Recurrence, render_topic
+from config import (
+    SCHEDULER_RESYNC_SECONDS, SCHEDULER_HEAP_LIMIT, SCHEDULER_WORKERS, SCHEDULER_PLATFORM_CONCURRENCY,
+    SCHEDULER_ACCOUNT_CONCURRENCY, SCHEDULER_WORKER_ID, SCHEDULER_LEASE_SECONDS, SCHEDULER_MAX_ATTEMPTS,
+    SCHEDULER_CLAIM_BATCH, SCHEDULER_PREGENERATE_HORIZON_SECONDS, SCHEDULER_PREGENERATE_INTERVAL_SECONDS,
+    SCHEDULER_PREGENERATE_CONCURRENCY, SCHEDULER_PREGENERATE_BATCH, SCHEDULER_EXPANSION_HORIZON_SECONDS,
+    SCHEDULER_EXPANSION_INTERVAL_SECONDS, SCHEDULER_EXPANSION_BATCH, MAX_SCHEDULED_POSTS,
+    AUTOMATION_MIN_INTERVAL_SECONDS, SCHEDULER_SHUTDOWN_TIMEOUT
+)
 
-class ContentScheduler:
+# Fields selectable through get_user_scheduled_posts(fields=...), mapped to scheduled_posts columns
+SCHEDULED_POST_FIELDS = {
+    "id": "id",
+    "topic": "topic",
+    "platforms": "platforms",
+    "style": "style",
+    "scheduled_time": "scheduled_time",
+    "status": "status",
+    "error_message": "error_message",
+    "created_at": "created_at",
+    "posted_at": "posted_at"
+}
+DEFAULT_SCHEDULED_POST_FIELDS = ["id", "topic", "platforms", "style", "scheduled_time", "status", "error_message"]
+SCHEDULED_POST_COLUMNS = "id, user_id, topic, platforms, style, scheduled_time, content_json"
+
+def _post_dict(post) -> Dict:
+    return {
+        "id": post[0],
+        "user_id": post[1],
+        "topic": post[2],
+        "platforms": json.loads(post[3]),
+        "style": post[4],
+        "scheduled_time": post[5],
+        "content": json.loads(post[6]) if post[6] else None
+    }
+
+class KeyedLimiter:
+    """Concurrency limits per key (platform, account) that never block a thread
+    
+    Work that can't start yet is parked on the first key that is at its limit and started by whichever
+    release frees that key, so one busy account can't tie up the shared worker pool.
+    """
+    
     def __init__(self):
+        self._active: Dict[str, int] = {}
+        self._parked: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+    
+    def _full_key(self, keys: List[Tuple[str, int]]) -> Optional[str]:
+        return next((key for key, limit in keys if self._active.get(key, 0) >= limit), None)
+    
+    def _take(self, keys: List[Tuple[str, int]]):
+        for key, _ in keys:
+            self._active[key] = self._active.get(key, 0) + 1
+    
+    def submit(self, keys: List[Tuple[str, int]], start: Callable[[], None]):
+        """Call start() now if every (key, limit) has room, else once it does; start must not block"""
+        with self._lock:
+            full = self._full_key(keys)
+            if full is not None:
+                self._parked.setdefault(full, deque()).append((keys, start))
+                return
+            self._take(keys)
+        start()
+    
+    def release(self, keys: List[Tuple[str, int]]):
+        """Give back the keys taken for one submit() and start parked work that now fits"""
+        ready = []
+        with self._lock:
+            for key, _ in keys:
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+            for key, _ in keys:
+                queue = self._parked.get(key)
+                while queue:
+                    waiting_keys, start = queue[0]
+                    full = self._full_key(waiting_keys)
+                    if full == key:
+                        break
+                    queue.popleft()
+                    if full is None:
+                        self._take(waiting_keys)
+                        ready.append(start)
+                    else:
+                        self._parked.setdefault(full, deque()).append((waiting_keys, start))
+                if queue is not None and not queue:
+                    del self._parked[key]
+        for start in ready:
+            start()
+    
+    def parked(self) -> int:
+        with self._lock:
+            return sum(len(queue) for queue in self._parked.values())
+
+class _Publication:
+    """Progress of one post's per-platform publishes"""
+    __slots__ = ("post", "remaining", "succeeded", "total")
+    
+    def __init__(self, post: Dict, remaining: int):
+        self.post = post
+        self.remaining = remaining
+        self.succeeded = 0
+        self.total = len(post["platforms"])
+
+class ContentScheduler:
+    def __init__(self, workers: int = SCHEDULER_WORKERS, platform_concurrency: int = SCHEDULER_PLATFORM_CONCURRENCY,
+                 account_concurrency: int = SCHEDULER_ACCOUNT_CONCURRENCY, worker_id: str = SCHEDULER_WORKER_ID,
+                 lease_seconds: float = SCHEDULER_LEASE_SECONDS, max_attempts: int = SCHEDULER_MAX_ATTEMPTS,
+                 claim_batch: int = SCHEDULER_CLAIM_BATCH):
+        self.workers = max(1, workers)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.claim_batch = max(1, claim_batch)
+        self.platform_concurrency = max(1, platform_concurrency)
+        self.account_concurrency = max(1, account_concurrency)
+        self.limits = KeyedLimiter()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Claimed posts not finished yet, and pool tasks submitted but not finished (parked publishes excluded)
+        self._capacity = threading.Condition()
+        self._held: Dict[int, Dict] = {}
+        self._busy = 0
+        self._lost = set()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._closing = threading.Event()
         self.init_scheduler_db()
     
+    def pool(self) -> ThreadPoolExecutor:
+        """Worker pool for due posts; its size is the global concurrency limit"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._stopping.clear()
+                    self._closing.clear()
+                    self._heartbeat = threading.Thread(target=self._renew_held, name="jacai-lease", daemon=True)
+                    self._heartbeat.start()
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jacai-publish")
+        return self._pool
+    
+    def _renew_held(self):
+        """Keep leases alive for every post this worker holds, including ones queued or parked locally"""
+        while not self._stopping.wait(self.lease_seconds / 3):
+            with self._capacity:
+                post_ids = list(self._held)
+            if not post_ids:
+                continue
+            try:
+                lost = self.renew_leases(post_ids)
+            except Exception as e:
+                print(f"Scheduler lease renewal failed: {e}")
+                continue
+            if lost:
+                with self._capacity:
+                    self._lost.update(post_id for post_id in lost if post_id in self._held)
+    
+    def _submit(self, func, *args):
+        """Run func on the pool, counting it as busy until it returns"""
+        with self._capacity:
+            self._busy += 1
+        
+        def run():
+            try:
+                func(*args)
+            finally:
+                with self._capacity:
+                    self._busy -= 1
+                    self._capacity.notify_all()
+        self.pool().submit(run)
+    
+    def _finish_post(self, post_id: int):
+        with self._capacity:
+            self._held.pop(post_id, None)
+            self._lost.discard(post_id)
+            self._capacity.notify_all()
+    
     def init_scheduler_db(self):
         """Initialize scheduler database tables"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scheduled_posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                topic TEXT NOT NULL,
-                platforms TEXT NOT NULL,
-                style TEXT NOT NULL,
-                scheduled_time TIMESTAMP NOT NULL,
-                status TEXT DEFAULT 'pending',
-                content_json TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                posted_at TIMESTAMP,
-                error_message TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS automation_rules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                name TEXT NOT NULL,
-                topic_template TEXT,
-                platforms TEXT NOT NULL,
-                style TEXT NOT NULL,
-                frequency TEXT NOT NULL,
-                time_slots TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        db.migrate()
     
     def schedule_post(self, user_id: int, topic: str, platforms: List[str], style: str, scheduled_time: datetime) -> Dict:
         """Schedule a post for future publishing"""
         try:
-            conn = sqlite3.connect('jacai.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO scheduled_posts (user_id, topic, platforms, style, scheduled_time)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, topic, json.dumps(platforms), style, scheduled_time))
-            
-            post_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with db.transaction() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO scheduled_posts (user_id, topic, platforms, style, scheduled_time)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, topic, json.dumps(platforms), style, scheduled_time))
+                
+                post_id = cursor.lastrowid
             
+            dispatcher.notify(scheduled_time)
             return {
                 "success": True,
                 "post_id": post_id,
@@ -79,20 +227,29 @@ class ContentScheduler:
     
     def create_automation_rule(self, user_id: int, name: str, topic_template: str, 
                              platforms: List[str], style: str, frequency: str, time_slots: List[str]) -> Dict:
-        """Create automation rule for recurring posts"""
+        """Create automation rule for recurring posts
+        
+        frequency is hourly, daily, weekdays, weekends, weekly (Mondays), monthly (the 1st) or a 5-field cron
+        expression; anything else is rejected because it could never be expanded into posts. hourly and cron
+        expressions carry their own times, so time_slots must be empty for them. Rules that would fire more often
+        than AUTOMATION_MIN_INTERVAL_SECONDS are rejected.
+        """
         try:
-            conn = sqlite3.connect('jacai.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO automation_rules (user_id, name, topic_template, platforms, style, frequency, time_slots)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, name, topic_template, json.dumps(platforms), style, frequency, json.dumps(time_slots)))
-            
-            rule_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            _rule_recurrence(frequency, time_slots)
+            with db.transaction() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO automation_rules (user_id, name, topic_template, platforms, style, frequency, time_slots)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, name, topic_template, json.dumps(platforms), style, frequency, json.dumps(time_slots)))
+                
+                rule_id = cursor.lastrowid
             
+            # Materialize the first occurrences now rather than at the dispatcher's next expansion pass
+            expansion = self.expand_automation_rules(rule_id=rule_id)
+            if expansion["earliest"] is not None:
+                dispatcher.notify(expansion["earliest"])
             return {
                 "success": True,
                 "rule_id": rule_id,
@@ -101,107 +258,365 @@ class ContentScheduler:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_pending_posts(self) -> List[Dict]:
-        """Get posts ready to be published"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
+    def expand_automation_rules(self, horizon: float = SCHEDULER_EXPANSION_HORIZON_SECONDS,
+                                batch_size: int = SCHEDULER_EXPANSION_BATCH, rule_id: int = None) -> Dict:
+        """Turn active rules into scheduled_posts up to now + horizon
         
-        cursor.execute('''
-            SELECT id, user_id, topic, platforms, style, scheduled_time, content_json
-            FROM scheduled_posts 
-            WHERE status = 'pending' AND scheduled_time <= ?
-        ''', (datetime.now(),))
+        Each rule's expanded_until is its high-water mark, so a pass only inserts occurrences after it. Rules are
+        refilled once less than half the horizon is left, so most passes touch only a small share of the rules.
+        """
+        now = datetime.now()
+        until = now + timedelta(seconds=horizon)
+        refill_before = now + timedelta(seconds=horizon / 2)
+        rule_filter, params = ("AND id = ?", (rule_id,)) if rule_id is not None else ("", ())
+        result = {"rules": 0, "inserted": 0, "earliest": None}
         
-        posts = cursor.fetchall()
-        conn.close()
+        while horizon > 0:
+            # The unique (rule_id, scheduled_time) index makes any overlap between workers harmless
+            with db.immediate() as conn:
+                rules = conn.execute(f'''
+                    SELECT id, user_id, name, topic_template, platforms, style, frequency, time_slots, expanded_until
+                    FROM automation_rules
+                    WHERE is_active AND (expanded_until IS NULL OR expanded_until < ?) {rule_filter}
+                    LIMIT ?
+                ''', (refill_before, *params, max(1, batch_size))).fetchall()
+                if not rules:
+                    break
+                
+                rows = []
+                for current_id, user_id, name, template, platforms, style, frequency, time_slots, expanded_until in rules:
+                    # Never backfill occurrences that passed while nothing was expanding
+                    start = max(_as_datetime(expanded_until), now) if expanded_until else now
+                    try:
+                        recurrence = _rule_recurrence(frequency, json.loads(time_slots))
+                    except ValueError as e:
+                        print(f"Skipping automation rule {current_id}: {e}")
+                        continue
+                    # Every occurrence later costs a generation and a publish, so one rule's share of a horizon is capped
+                    occurrences = list(itertools.islice(recurrence.between(start, until), MAX_SCHEDULED_POSTS + 1))
+                    if len(occurrences) > MAX_SCHEDULED_POSTS:
+                        print(f"Automation rule {current_id} capped at {MAX_SCHEDULED_POSTS} posts until {until}")
+                        occurrences = occurrences[:MAX_SCHEDULED_POSTS]
+                    rows.extend(
+                        (user_id, render_topic(template or name, when), platforms, style, when, current_id)
+                        for when in occurrences
+                    )
+                
+                cursor = conn.executemany('''
+                    INSERT OR IGNORE INTO scheduled_posts (user_id, topic, platforms, style, scheduled_time, rule_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                # Invalid rules advance too, so they are retried at the next refill instead of every pass
+                conn.executemany(
+                    "UPDATE automation_rules SET expanded_until = ? WHERE id = ?",
+                    [(until, rule[0]) for rule in rules]
+                )
+            
+            result["rules"] += len(rules)
+            result["inserted"] += max(cursor.rowcount, 0)
+            if rows:
+                earliest = min(row[4] for row in rows)
+                result["earliest"] = min(result["earliest"] or earliest, earliest)
         
-        return [
-            {
-                "id": post[0],
-                "user_id": post[1],
-                "topic": post[2],
-                "platforms": json.loads(post[3]),
-                "style": post[4],
-                "scheduled_time": post[5],
-                "content": json.loads(post[6]) if post[6] else None
-            }
-            for post in posts
-        ]
+        return result
+    
+    def get_pending_posts(self) -> List[Dict]:
+        """Get posts ready to be published (read-only; use claim_due_posts to process them)"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {SCHEDULED_POST_COLUMNS}
+                FROM scheduled_posts 
+                WHERE status = 'pending' AND scheduled_time <= ?
+                ORDER BY scheduled_time
+            ''', (datetime.now(),))
+            
+            posts = cursor.fetchall()
+        
+        return [_post_dict(post) for post in posts]
+    
+    def claim_due_posts(self, limit: int = None) -> List[Dict]:
+        """Atomically move due posts, and posts whose lease expired (their worker died), to processing for this worker"""
+        now = datetime.now()
+        lease_now = time.time()
+        with db.immediate() as conn:
+            rows = conn.execute(f'''
+                SELECT {SCHEDULED_POST_COLUMNS}, attempts
+                FROM scheduled_posts
+                WHERE (status = 'pending' AND scheduled_time <= ?)
+                   OR (status = 'processing' AND lease_expires_at < ?)
+                ORDER BY scheduled_time
+                LIMIT ?
+            ''', (now, lease_now, limit or self.claim_batch)).fetchall()
+            
+            abandoned = [row[0] for row in rows if row[-1] >= self.max_attempts]
+            claimed = [row for row in rows if row[-1] < self.max_attempts]
+            conn.executemany(
+                "UPDATE scheduled_posts SET status = 'failed', error_message = ?, worker_id = NULL, "
+                "lease_expires_at = NULL WHERE id = ?",
+                [(f"Abandoned after {self.max_attempts} attempts", post_id) for post_id in abandoned]
+            )
+            conn.executemany(
+                "UPDATE scheduled_posts SET status = 'processing', worker_id = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(self.worker_id, lease_now + self.lease_seconds, row[0]) for row in claimed]
+            )
+        
+        return [_post_dict(row) for row in claimed]
+    
+    def renew_lease(self, post_id: int) -> bool:
+        """Extend this worker's lease on a post; False if it was taken over in the meantime"""
+        return not self.renew_leases([post_id])
+    
+    def renew_leases(self, post_ids: List[int]) -> List[int]:
+        """Extend this worker's leases; returns the ids it no longer holds"""
+        held = set()
+        with db.transaction() as conn:
+            for start in range(0, len(post_ids), 500):
+                chunk = post_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                conn.execute(
+                    f"UPDATE scheduled_posts SET lease_expires_at = ? "
+                    f"WHERE id IN ({placeholders}) AND status = 'processing' AND worker_id = ?",
+                    (time.time() + self.lease_seconds, *chunk, self.worker_id)
+                )
+                held.update(row[0] for row in conn.execute(
+                    f"SELECT id FROM scheduled_posts WHERE id IN ({placeholders}) AND status = 'processing' AND worker_id = ?",
+                    (*chunk, self.worker_id)
+                ))
+        return [post_id for post_id in post_ids if post_id not in held]
     
     def process_scheduled_posts(self):
-        """Process all pending scheduled posts"""
-        pending_posts = self.get_pending_posts()
+        """Claim due posts as workers free up and hand them to the pool; returns once nothing due is left to claim
         
-        for post in pending_posts:
-            try:
-                # Generate content if not already generated
-                if not post["content"]:
-                    content_results = []
-                    for platform in post["platforms"]:
-                        content = ai_service.generate_content(post["topic"], platform, post["style"])
-                        content_results.append({
-                            "platform": platform,
-                            "content": content
-                        })
-                    
-                    # Save generated content
-                    self.update_post_content(post["id"], content_results)
-                    post["content"] = content_results
-                
-                # Post to social media platforms
-                self.publish_post(post)
+        Claimed posts may still be generating or publishing when this returns.
+        """
+        while True:
+            with self._capacity:
+                while (self._busy >= self.workers or len(self._held) >= self.claim_batch) and not self._closing.is_set():
+                    self._capacity.wait()
+                if self._closing.is_set():
+                    return
+                free = min(self.workers - self._busy, self.claim_batch - len(self._held))
+            
+            claimed = self.claim_due_posts(free)
+            for post in claimed:
+                with self._capacity:
+                    self._held[post["id"]] = post
+                self._submit(self.process_post, post)
+            if len(claimed) < free:
+                return
+    
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until every claimed post has finished; False on timeout"""
+        with self._capacity:
+            return self._capacity.wait_for(lambda: not self._held, timeout)
+    
+    def process_post(self, post: Dict):
+        """Generate (if needed) and publish one post; failures are recorded on that post only"""
+        published = False
+        try:
+            # Generate content if not already generated
+            if not post["content"]:
+                content_results = [
+                    {"platform": platform, "content": content}
+                    for platform, content in zip(post["platforms"], run_sync(self._generate_platforms(post)))
+                ]
                 
-            except Exception as e:
-                self.mark_post_failed(post["id"], str(e))
+                # Save generated content
+                self.update_post_content(post["id"], content_results)
+                post["content"] = content_results
+            
+            # Generation can be slow; don't publish a post another worker has since taken over
+            if not self.renew_lease(post["id"]):
+                return
+            
+            # Post to social media platforms; the publishes finish the post
+            published = True
+            self.publish_post(post)
+            
+        except Exception as e:
+            self.mark_post_failed(post["id"], str(e))
+        finally:
+            if not published:
+                self._finish_post(post["id"])
+    
+    async def _generate_platforms(self, post: Dict, priority: str = SCHEDULED) -> List[Dict]:
+        # A burst of due posts waits for provider quota rather than publishing fallback captions
+        wait_for_provider_quota.set(True)
+        weight = await run_io(user_weight, post["user_id"])
+        with generation_as(f"user:{post['user_id']}", priority, weight):
+            return await asyncio.gather(*[
+                ai_service.generate_content_async(post["topic"], platform, post["style"])
+                for platform in post["platforms"]
+            ])
+    
+    def get_upcoming_posts(self, horizon: float, limit: int = SCHEDULER_PREGENERATE_BATCH) -> List[Dict]:
+        """Pending posts without content that are due within horizon seconds, soonest first"""
+        with db.connection() as conn:
+            posts = conn.execute(f'''
+                SELECT {SCHEDULED_POST_COLUMNS}
+                FROM scheduled_posts
+                WHERE status = 'pending' AND scheduled_time <= ? AND content_json IS NULL
+                ORDER BY scheduled_time
+                LIMIT ?
+            ''', (datetime.now() + timedelta(seconds=horizon), limit)).fetchall()
+        return [_post_dict(post) for post in posts]
+    
+    def save_pregenerated_content(self, post_id: int, content: List[Dict]) -> bool:
+        """Store content for a post that is still pending and has none; False if it was claimed or filled meanwhile"""
+        with db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_posts SET content_json = ? WHERE id = ? AND status = 'pending' AND content_json IS NULL",
+                (json.dumps(content), post_id)
+            )
+            return cursor.rowcount == 1
+    
+    async def pregenerate_upcoming(self, horizon: float = SCHEDULER_PREGENERATE_HORIZON_SECONDS,
+                                   concurrency: int = SCHEDULER_PREGENERATE_CONCURRENCY) -> int:
+        """Fill content_json ahead of time at background priority; returns the number of posts filled"""
+        posts = await run_io(self.get_upcoming_posts, horizon)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def pregenerate(post: Dict) -> bool:
+            async with semaphore:
+                contents = await self._generate_platforms(post, BACKGROUND)
+            # Leave fallback content for the publish-time attempt rather than posting it
+            if any(content.get("ai_provider") == "fallback" for content in contents):
+                return False
+            content_results = [
+                {"platform": platform, "content": content}
+                for platform, content in zip(post["platforms"], contents)
+            ]
+            return await run_io(self.save_pregenerated_content, post["id"], content_results)
+        
+        results = await asyncio.gather(*[pregenerate(post) for post in posts], return_exceptions=True)
+        return sum(1 for result in results if result is True)
     
     def publish_post(self, post: Dict):
-        """Publish post to social media platforms"""
+        """Publish post to social media platforms
+        
+        Each platform's publish runs on the pool once its platform and account limits have room; the last
+        one to finish marks the post completed or failed.
+        """
         try:
             # Get user's social accounts
             user_accounts = self.get_user_social_accounts(post["user_id"])
             
-            success_count = 0
-            total_platforms = len(post["platforms"])
-            
+            units = []
             for content_item in post["content"]:
                 platform = content_item["platform"]
-                content = content_item["content"]
                 
                 # Find matching social account
                 account = next((acc for acc in user_accounts if acc["platform"] == platform), None)
                 
                 if account:
-                    result = social_service.post_content(
-                        platform, 
-                        content, 
-                        account["access_token"], 
-                        account.get("account_id")
-                    )
-                    
-                    if result["success"]:
-                        success_count += 1
-            
-            if success_count > 0:
-                self.mark_post_completed(post["id"], f"Posted to {success_count}/{total_platforms} platforms")
-            else:
-                self.mark_post_failed(post["id"], "No successful posts")
-                
+                    units.append((platform, content_item["content"], account))
         except Exception as e:
             self.mark_post_failed(post["id"], str(e))
+            self._finish_post(post["id"])
+            return
+        
+        publication = _Publication(post, len(units))
+        if not units:
+            self._complete_publication(publication)
+            return
+        for platform, content, account in units:
+            keys = [
+                (f"account:{platform}:{post['user_id']}", self.account_concurrency),
+                (f"platform:{platform}", self.platform_concurrency)
+            ]
+            self.limits.submit(keys, functools.partial(
+                self._submit, self._publish_one, publication, platform, content, account, keys
+            ))
     
-    def get_user_social_accounts(self, user_id: int) -> List[Dict]:
-        """Get user's linked social accounts"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
+    def _publish_one(self, publication: _Publication, platform: str, content: Dict, account: Dict, keys: List[tuple]):
+        try:
+            with self._capacity:
+                lost = publication.post["id"] in self._lost
+            if lost:
+                # Our lease lapsed and another worker owns the post now; publishing here would post it twice
+                succeeded = False
+            else:
+                result = social_service.post_content(platform, content, account["access_token"], account.get("account_id"))
+                succeeded = bool(result.get("success"))
+        except Exception as e:
+            print(f"Publishing post {publication.post['id']} to {platform} failed: {e}")
+            succeeded = False
+        finally:
+            self.limits.release(keys)
         
-        cursor.execute('''
-            SELECT platform, access_token, account_name
-            FROM social_accounts 
-            WHERE user_id = ? AND is_active = TRUE
-        ''', (user_id,))
+        with self._capacity:
+            publication.succeeded += succeeded
+            publication.remaining -= 1
+            done = publication.remaining == 0
+        if done:
+            self._complete_publication(publication)
+    
+    def _complete_publication(self, publication: _Publication):
+        post_id = publication.post["id"]
+        try:
+            if publication.succeeded > 0:
+                self.mark_post_completed(post_id, f"Posted to {publication.succeeded}/{publication.total} platforms")
+            else:
+                self.mark_post_failed(post_id, "No successful posts")
+        except Exception as e:
+            print(f"Recording the outcome of post {post_id} failed: {e}")
+        finally:
+            self._finish_post(post_id)
+    
+    def stats(self) -> dict:
+        with self._capacity:
+            held, busy = len(self._held), self._busy
+        return {
+            "workers": self.workers,
+            "busy": busy,
+            "held_posts": held,
+            "parked_publishes": self.limits.parked()
+        }
+    
+    def stop_claiming(self):
+        """Make process_scheduled_posts return instead of waiting for a free worker; used on shutdown"""
+        self._closing.set()
+        with self._capacity:
+            self._capacity.notify_all()
+    
+    def shutdown(self, timeout: float = SCHEDULER_SHUTDOWN_TIMEOUT):
+        """Let claimed posts finish (parked publishes included) for up to timeout seconds, then stop the pool
         
-        accounts = cursor.fetchall()
-        conn.close()
+        Posts still unfinished keep their claim without renewal, so another worker retries them once the lease expires.
+        """
+        deadline = time.monotonic() + timeout
+        self.stop_claiming()
+        idle = self.wait_idle(timeout)
+        if not idle:
+            with self._capacity:
+                outstanding = sorted(self._held)
+            print(f"Scheduler shutdown timed out with {len(outstanding)} post(s) unfinished: {outstanding[:20]}; "
+                  f"they are retried after their lease expires")
+        self._stopping.set()
+        with self._pool_lock:
+            if self._heartbeat is not None:
+                self._heartbeat.join(max(0.0, deadline - time.monotonic()))
+                self._heartbeat = None
+            if self._pool is not None:
+                # A hung publish must not block shutdown; drop queued work and leave running threads behind
+                self._pool.shutdown(wait=idle, cancel_futures=not idle)
+                self._pool = None
+    
+    def get_user_social_accounts(self, user_id: int) -> List[Dict]:
+        """Get user's linked social accounts"""
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT platform, access_token, account_name
+                FROM social_accounts 
+                WHERE user_id = ? AND is_active = TRUE
+            ''', (user_id,))
+            
+            accounts = cursor.fetchall()
         
         return [
             {
@@ -214,74 +629,239 @@ class ContentScheduler:
     
     def update_post_content(self, post_id: int, content: List[Dict]):
         """Update post with generated content"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE scheduled_posts 
-            SET content_json = ? 
-            WHERE id = ?
-        ''', (json.dumps(content), post_id))
-        
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE scheduled_posts 
+                SET content_json = ? 
+                WHERE id = ?
+            ''', (json.dumps(content), post_id))
     
     def mark_post_completed(self, post_id: int, message: str):
-        """Mark post as completed"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE scheduled_posts 
-            SET status = 'completed', posted_at = ?, error_message = ?
-            WHERE id = ?
-        ''', (datetime.now(), message, post_id))
-        
-        conn.commit()
-        conn.close()
+        """Mark post as completed, if this worker still holds its claim"""
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE scheduled_posts 
+                SET status = 'completed', posted_at = ?, error_message = ?, worker_id = NULL, lease_expires_at = NULL
+                WHERE id = ? AND status = 'processing' AND worker_id = ?
+            ''', (datetime.now(), message, post_id, self.worker_id))
     
     def mark_post_failed(self, post_id: int, error: str):
-        """Mark post as failed"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE scheduled_posts 
-            SET status = 'failed', error_message = ?
-            WHERE id = ?
-        ''', (error, post_id))
-        
-        conn.commit()
-        conn.close()
+        """Mark post as failed, if this worker still holds its claim"""
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE scheduled_posts 
+                SET status = 'failed', error_message = ?, worker_id = NULL, lease_expires_at = NULL
+                WHERE id = ? AND status = 'processing' AND worker_id = ?
+            ''', (error, post_id, self.worker_id))
     
-    def get_user_scheduled_posts(self, user_id: int) -> List[Dict]:
-        """Get user's scheduled posts"""
-        conn = sqlite3.connect('jacai.db')
-        cursor = conn.cursor()
+    def get_user_scheduled_posts(self, user_id: int, cursor: Optional[str] = None, limit: int = 50,
+                                 fields: Optional[str] = None) -> Dict:
+        """Get one page of user's scheduled posts, newest scheduled_time first"""
+        selected = select_fields(fields, SCHEDULED_POST_FIELDS, DEFAULT_SCHEDULED_POST_FIELDS)
         
-        cursor.execute('''
-            SELECT id, topic, platforms, style, scheduled_time, status, error_message
-            FROM scheduled_posts 
-            WHERE user_id = ?
-            ORDER BY scheduled_time DESC
-            LIMIT 50
-        ''', (user_id,))
+        with db.connection() as conn:
+            posts, next_cursor = keyset_page(
+                conn, "scheduled_posts", SCHEDULED_POST_FIELDS, selected,
+                "user_id", user_id, "scheduled_time", cursor, clamp_limit(limit)
+            )
         
-        posts = cursor.fetchall()
-        conn.close()
+        for post in posts:
+            if "platforms" in post:
+                post["platforms"] = json.loads(post["platforms"])
         
-        return [
-            {
-                "id": post[0],
-                "topic": post[1],
-                "platforms": json.loads(post[2]),
-                "style": post[3],
-                "scheduled_time": post[4],
-                "status": post[5],
-                "error_message": post[6]
+        return {"posts": posts, "next_cursor": next_cursor}
+
+def _rule_recurrence(frequency: str, time_slots: List[str]) -> Recurrence:
+    """Parse an automation rule's schedule, refusing ones that fire more often than AUTOMATION_MIN_INTERVAL_SECONDS"""
+    recurrence = Recurrence(frequency, time_slots)
+    if recurrence.shortest_gap.total_seconds() < AUTOMATION_MIN_INTERVAL_SECONDS:
+        raise ValueError(
+            f"{frequency} fires every {recurrence.shortest_gap}; automation rules may fire at most every "
+            f"{timedelta(seconds=AUTOMATION_MIN_INTERVAL_SECONDS)}"
+        )
+    return recurrence
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+class SchedulerDispatcher:
+    """Runs process_scheduled_posts when the next post is due instead of polling on a fixed interval
+    
+    Upcoming scheduled_times sit in a min-heap; the thread sleeps until the earliest one and is woken
+    early when schedule_post adds an earlier time. A slow resync picks up posts scheduled elsewhere.
+    Every pregenerate_interval it also fills content for posts due within the look-ahead horizon, and every
+    expansion_interval it materializes automation rules into scheduled_posts.
+    """
+    
+    def __init__(self, content_scheduler: ContentScheduler, resync_seconds: float = SCHEDULER_RESYNC_SECONDS,
+                 heap_limit: int = SCHEDULER_HEAP_LIMIT, pregenerate_horizon: float = SCHEDULER_PREGENERATE_HORIZON_SECONDS,
+                 pregenerate_interval: float = SCHEDULER_PREGENERATE_INTERVAL_SECONDS,
+                 expansion_interval: float = SCHEDULER_EXPANSION_INTERVAL_SECONDS):
+        self.content_scheduler = content_scheduler
+        self.resync_seconds = resync_seconds
+        self.heap_limit = heap_limit
+        self.pregenerate_horizon = pregenerate_horizon
+        self.pregenerate_interval = pregenerate_interval
+        self._next_pregenerate = 0.0
+        self._pregeneration = None
+        self.pregenerated = 0
+        self.expansion_interval = expansion_interval
+        self._next_expansion = 0.0
+        self.expanded = 0
+        self._heap: List[datetime] = []
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._next_resync = 0.0
+        self.runs = 0
+    
+    def _load(self):
+        """Refill the heap with the earliest pending scheduled_times"""
+        with db.connection() as conn:
+            rows = conn.execute(
+                "SELECT scheduled_time FROM scheduled_posts WHERE status = 'pending' ORDER BY scheduled_time LIMIT ?",
+                (self.heap_limit,)
+            ).fetchall()
+            # Wake when the earliest lease held by another (possibly dead) worker runs out
+            lease = conn.execute(
+                "SELECT MIN(lease_expires_at) FROM scheduled_posts WHERE status = 'processing'"
+            ).fetchone()[0]
+        heap = [_as_datetime(row[0]) for row in rows]
+        if lease is not None:
+            heap.append(datetime.fromtimestamp(lease))
+        heapq.heapify(heap)
+        with self._condition:
+            self._heap = heap
+            self._next_resync = time.monotonic() + self.resync_seconds
+    
+    def notify(self, scheduled_time: datetime):
+        """Track a newly scheduled post; wakes the loop if it is now the earliest"""
+        scheduled_time = _as_datetime(scheduled_time)
+        with self._condition:
+            if not self._running:
+                return
+            earliest = self._heap[0] if self._heap else None
+            heapq.heappush(self._heap, scheduled_time)
+            if earliest is None or scheduled_time < earliest:
+                self._condition.notify()
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._load()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="jacai-scheduler", daemon=True)
+        self._thread.start()
+        print("⏰ Scheduler dispatcher started")
+    
+    def stop(self, timeout: float = SCHEDULER_SHUTDOWN_TIMEOUT):
+        """Stop after the current run (if any) finishes, waiting at most timeout seconds in total"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self.content_scheduler.stop_claiming()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f"Scheduler dispatcher still running after {timeout}s; leaving it behind")
+            self._thread = None
+        if self._pregeneration is not None:
+            self._pregeneration.cancel()
+        self.content_scheduler.shutdown(max(0.0, deadline - time.monotonic()))
+    
+    def _start_pregeneration(self):
+        """Kick off a look-ahead pass on the background loop unless one is still running"""
+        self._next_pregenerate = time.monotonic() + self.pregenerate_interval
+        if self._pregeneration is not None and not self._pregeneration.done():
+            return
+        self._pregeneration = asyncio.run_coroutine_threadsafe(
+            self.content_scheduler.pregenerate_upcoming(self.pregenerate_horizon), background_loop()
+        )
+        self._pregeneration.add_done_callback(self._pregeneration_done)
+    
+    def _pregeneration_done(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Scheduler pre-generation failed: {future.exception()}")
+            return
+        self.pregenerated += future.result()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    now = datetime.now()
+                    if self._heap and self._heap[0] <= now:
+                        break
+                    wait = self._next_resync - time.monotonic()
+                    if self.pregenerate_horizon > 0:
+                        wait = min(wait, self._next_pregenerate - time.monotonic())
+                    if self.expansion_interval > 0:
+                        wait = min(wait, self._next_expansion - time.monotonic())
+                    if wait <= 0:
+                        break
+                    if self._heap:
+                        wait = min(wait, (self._heap[0] - now).total_seconds())
+                    self._condition.wait(wait)
+                if not self._running:
+                    return
+                
+                now = datetime.now()
+                due = bool(self._heap) and self._heap[0] <= now
+                while self._heap and self._heap[0] <= now:
+                    heapq.heappop(self._heap)
+                resync = time.monotonic() >= self._next_resync or (due and not self._heap)
+                pregenerate = self.pregenerate_horizon > 0 and time.monotonic() >= self._next_pregenerate
+                expand = self.expansion_interval > 0 and time.monotonic() >= self._next_expansion
+            
+            if pregenerate:
+                self._start_pregeneration()
+            try:
+                if expand:
+                    self._next_expansion = time.monotonic() + self.expansion_interval
+                    self.expanded += self.content_scheduler.expand_automation_rules()["inserted"]
+                    resync = True
+                if due:
+                    self.content_scheduler.process_scheduled_posts()
+                    self.runs += 1
+                if resync:
+                    self._load()
+            except Exception as e:
+                print(f"Scheduler run failed: {e}")
+                with self._condition:
+                    self._next_resync = time.monotonic() + min(self.resync_seconds, 30)
+    
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "running": self._running,
+                "tracked": len(self._heap),
+                "next_due": self._heap[0].isoformat() if self._heap else None,
+                "runs": self.runs,
+                "pregenerated": self.pregenerated,
+                "expanded": self.expanded,
+                "publishing": self.content_scheduler.stats()
             }
-            for post in posts
-        ]
 
-# Global scheduler instance
-scheduler = ContentScheduler()
\ No newline at end of file
+# Global scheduler instances
+scheduler = ContentScheduler()
+dispatcher = SchedulerDispatcher(scheduler)
+
+if __name__ == "__main__":
+    # Standalone dispatcher, e.g. with SCHEDULER_ENABLED=false on the web workers
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    
+    dispatcher.start()
+    stopped.wait()
+    dispatcher.stop()
+    print("⏰ Scheduler dispatcher stopped")
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Single-Flight Request Coalescing for JACAI - Share One Call Among Identical Concurrent Requests
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    def __init__(self):
+        # concurrent.futures.Future is thread-safe, so callers on different event loops
+        # (uvicorn's and the sync wrapper's background loop) can share one in-flight call
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Run fn() once per key at a time; concurrent callers with the same key await the same result"""
+        with self._lock:
+            shared = self._calls.get(key)
+            if shared is None:
+                shared = Future()
+                self._calls[key] = shared
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.coalesced += 1
+        
+        if not leader:
+            # shield: a follower giving up must not cancel the call for everyone else
+            return await asyncio.shield(asyncio.wrap_future(shared))
+        
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda t: self._finish(key, shared, t))
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: Hashable, shared: Future, task: asyncio.Future):
+        with self._lock:
+            self._calls.pop(key, None)
+        if task.cancelled():
+            shared.cancel()
+        elif task.exception() is not None:
+            shared.set_exception(task.exception())
+        else:
+            shared.set_result(task.result())
+    
+    def stats(self) -> dict:
+        """executed = real calls made, coalesced = calls saved by sharing"""
+        with self._lock:
+            total = self.executed + self.coalesced
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+                "saved_ratio": round(self.coalesced / total, 4) if total else 0.0
+            }
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Import the app modules from the repo root against a throwaway database
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+# Tests drive many requests from one user; the API and provider quotas would turn them into 429s
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("RATE_LIMIT_PER_HOUR", "0")
+os.environ.setdefault("AI_PROVIDER_RATE_PER_MINUTE", "0")
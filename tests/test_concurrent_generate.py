@@ -0,0 +1,46 @@
+import asyncio
+import json
+import time
+import httpx
+import ai_service
+import enhanced_app
+
+LATENCY = 0.5
+REQUESTS = 16
+
+def test_concurrent_generate_calls_overlap(monkeypatch):
+    """N concurrent /api/generate calls against a fixed-latency provider finish in far less than N x the latency"""
+    async def fake_gemini(prompt: str) -> str:
+        await asyncio.sleep(LATENCY)
+        return json.dumps({"caption": "caption", "hashtags": "#tag", "image_prompt": "image"})
+    
+    monkeypatch.setattr(enhanced_app, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(ai_service.ai_service, "gemini_enabled", True)
+    monkeypatch.setattr(ai_service.ai_service, "_call_gemini", fake_gemini)
+    
+    async def run() -> float:
+        enhanced_app.init_db()
+        transport = httpx.ASGITransport(app=enhanced_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            credentials = {"username": "concurrent", "email": "concurrent@example.com", "password": "concurrent-password"}
+            await client.post("/api/register", json=credentials)
+            login = await client.post("/api/login", json={"username": "concurrent", "password": "concurrent-password"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            
+            started = time.perf_counter()
+            # Distinct topics, so neither the generation cache nor single-flight can merge the calls
+            responses = await asyncio.gather(*[
+                client.post("/api/generate", headers=headers,
+                            json={"topic": f"topic {i}", "platforms": ["instagram"], "style": "casual"})
+                for i in range(REQUESTS)
+            ])
+            elapsed = time.perf_counter() - started
+        
+        for response in responses:
+            assert response.status_code == 200
+            assert response.json()["success"]
+            assert response.json()["results"][0]["content"]["ai_provider"] == "gemini"
+        return elapsed
+    
+    elapsed = asyncio.run(run())
+    assert elapsed < REQUESTS * LATENCY / 4, f"{REQUESTS} requests took {elapsed:.2f}s; they are serializing"
@@ -0,0 +1,25 @@
+import asyncio
+from fair_scheduler import FairScheduler, SCHEDULED
+
+def test_weight_two_tenant_gets_twice_the_share():
+    async def run():
+        scheduler = FairScheduler(slots=1)
+        granted = []
+        
+        async def work(tenant, weight):
+            async with scheduler.slot(tenant, SCHEDULED, weight):
+                granted.append(tenant)
+                await asyncio.sleep(0)
+        
+        # Hold the only slot so both tenants build a backlog before anything is granted
+        async with scheduler.slot("holder", SCHEDULED):
+            tasks = [asyncio.ensure_future(work("heavy", 2.0)) for _ in range(40)]
+            tasks += [asyncio.ensure_future(work("light", 1.0)) for _ in range(40)]
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        return granted
+    
+    # While both tenants are backlogged, the weight-2 tenant gets two slots for every one of the other
+    contended = asyncio.run(run())[:30]
+    assert contended.count("heavy") == 20
+    assert contended.count("light") == 10